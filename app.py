@@ -1,97 +1,22 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import os
-import re
 import sys
 import time
-import json
 import subprocess
 import requests
 import signal
 import threading
 import atexit
 from flask import Flask, render_template, jsonify, request, send_file
-from urllib.parse import unquote, quote
-
-
-def is_frozen():
-    return getattr(sys, 'frozen', False)
-
-
-def get_exe_dir():
-    if is_frozen():
-        return os.path.dirname(os.path.realpath(sys.executable))
-    return os.path.dirname(os.path.abspath(__file__))
-
-
-def get_base_dir():
-    return get_exe_dir()
-
-
-DEFAULT_CONFIG = {
-    "app_title": "Mod Manager",
-    "app_name": "Mod Manager",
-    "icon_path": "icon.png"
-}
-
-def load_config():
-    config_path = os.path.join(get_base_dir(), 'config.json')
-    if os.path.exists(config_path):
-        try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            pass
-    return DEFAULT_CONFIG.copy()
-
-def save_config(config):
-    config_path = os.path.join(get_base_dir(), 'config.json')
-    try:
-        with open(config_path, 'w', encoding='utf-8') as f:
-            json.dump(config, f, ensure_ascii=False, indent=4)
-        return True
-    except Exception as e:
-        print(f"Failed to save config: {e}")
-        return False
-
-CONFIG = load_config()
-
-# Favorites storage
-FAVORITES_FILE = os.path.join(get_base_dir(), 'favorites.json')
-
-def load_favorites():
-    if os.path.exists(FAVORITES_FILE):
-        try:
-            with open(FAVORITES_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            pass
-    return {}
-
-def save_favorites(favorites):
-    try:
-        with open(FAVORITES_FILE, 'w', encoding='utf-8') as f:
-            json.dump(favorites, f, ensure_ascii=False, indent=4)
-        return True
-    except Exception as e:
-        print(f"Failed to save favorites: {e}")
-        return False
-
-
-def get_mods_root():
-    return os.path.join(get_base_dir(), 'mods')
-
-
-def get_chars_img_dir():
-    return os.path.join(get_base_dir(), 'static', 'chars')
-
-
-def get_resource_dir():
-    if is_frozen():
-        meipass = getattr(sys, '_MEIPASS', None)
-        if meipass:
-            return meipass
-    return os.path.dirname(os.path.abspath(__file__))
+from urllib.parse import unquote
+from modcore import (
+    CONFIG, ModError, ModConflictError,
+    is_frozen, get_exe_dir, get_base_dir, save_config,
+    get_mods_root, get_mod_roots, get_chars_img_dir, get_resource_dir, get_archive_dir,
+    refresh_ini_index, sweep_archive, archive_worker,
+)
+import modcore
 
 
 def _enforce_single_app_py():
@@ -134,27 +59,10 @@ if not is_frozen():
     signal.signal(signal.SIGTERM, signal_handler)
 atexit.register(cleanup_on_exit)
 
-def sanitize_filename(name):
-    return re.sub(r'[\\/:*?"<>|]', '_', name).strip() or 'unnamed'
-
-PREVIEW_NAMES = ('preview.png', 'preview.jpg', 'preview.jpeg')
-IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp', '.ico'}
-
-def find_preview_path(dir_path):
-    for name in PREVIEW_NAMES:
-        p = os.path.join(dir_path, name)
-        if os.path.isfile(p):
-            return p
-    try:
-        for item in os.listdir(dir_path):
-            item_path = os.path.join(dir_path, item)
-            if os.path.isfile(item_path):
-                _, ext = os.path.splitext(item.lower())
-                if ext in IMAGE_EXTENSIONS and item.lower() not in PREVIEW_NAMES:
-                    return item_path
-    except OSError:
-        pass
-    return None
+@app.errorhandler(ModError)
+def handle_mod_error(e):
+    # e.g. a damaged archive index surfacing from a listing route
+    return jsonify({"status": "error", "message": e.message}), e.status
 
 @app.route('/')
 def index():
@@ -166,7 +74,6 @@ def get_config():
 
 @app.route('/api/config', methods=['POST'])
 def update_config():
-    global CONFIG
     new_config = request.json or {}
     CONFIG.update(new_config)
     if save_config(CONFIG):
@@ -180,6 +87,8 @@ def debug_info():
         "exe_dir": get_exe_dir(),
         "base_dir": get_base_dir(),
         "mods_root": get_mods_root(),
+        "mod_roots": get_mod_roots(),
+        "archive_dir": get_archive_dir(),
         "chars_img_dir": get_chars_img_dir(),
         "resource_dir": get_resource_dir(),
         "cwd": os.getcwd(),
@@ -187,65 +96,12 @@ def debug_info():
 
 @app.route('/api/chars', methods=['GET'])
 def get_chars():
-    mods_root = get_mods_root()
-    chars_img_dir = get_chars_img_dir()
-    if not os.path.exists(mods_root):
-        return jsonify([])
-    chars = []
-    for name in os.listdir(mods_root):
-        full = os.path.join(mods_root, name)
-        if not os.path.isdir(full):
-            continue
-        safe = sanitize_filename(name)
-        img_path = os.path.join(chars_img_dir, f"{safe}.png")
-        image_url = f"/static/chars/{safe}.png" if os.path.exists(img_path) else None
-        mod_count = sum(1 for x in os.listdir(full) if os.path.isdir(os.path.join(full, x)))
-        chars.append({"name": name, "image_url": image_url, "mod_count": mod_count})
-    chars.sort(key=lambda c: c["mod_count"], reverse=True)
-    return jsonify(chars)
+    return jsonify(modcore.list_chars())
 
 @app.route('/api/sync_chars', methods=['POST'])
 def sync_chars():
-    url = "https://api.kurobbs.com/wiki/core/catalogue/item/getPage"
-    headers = {
-        "accept": "application/json, text/plain, */*",
-        "accept-language": "zh-CN,zh;q=0.9",
-        "content-type": "application/x-www-form-urlencoded;charset=UTF-8",
-        "user-agent": "Mozilla/5.0",
-    }
-    data = "catalogueId=1105&page=1&limit=1000"
     try:
-        resp = requests.post(url, headers=headers, data=data, timeout=15)
-        resp.raise_for_status()
-        body = resp.json()
-        data_obj = body.get('data') or {}
-        results = data_obj.get('results') if isinstance(data_obj, dict) else {}
-        items = (results.get('records') if isinstance(results, dict) else None) or []
-        if not items and isinstance(data_obj, dict):
-            items = data_obj.get('list') or data_obj.get('items') or []
-        if not items and isinstance(data_obj, list):
-            items = data_obj
-
-        saved_chars = []
-        for item in items:
-            name = item.get('name') or item.get('title') or ''
-            if not name:
-                continue
-            safe_name = sanitize_filename(name)
-            char_path = os.path.join(get_mods_root(), safe_name)
-            if not os.path.exists(char_path):
-                os.makedirs(char_path)
-            content = item.get('content') or {}
-            icon = content.get('contentUrl') or item.get('icon') or item.get('cover') or item.get('image')
-            if icon:
-                try:
-                    img_resp = requests.get(icon, timeout=10)
-                    img_resp.raise_for_status()
-                    with open(os.path.join(get_chars_img_dir(), f"{safe_name}.png"), 'wb') as f:
-                        f.write(img_resp.content)
-                except Exception:
-                    pass
-            saved_chars.append(safe_name)
+        saved_chars = modcore.sync_chars()
         return jsonify({"status": "success", "count": len(saved_chars), "chars": saved_chars})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -256,10 +112,7 @@ def mod_preview():
     mod = request.args.get('mod')
     if not char or not mod:
         return '', 404
-    char = unquote(char)
-    mod = unquote(mod)
-    mod_dir = os.path.join(get_mods_root(), char, mod)
-    preview_path = find_preview_path(mod_dir)
+    preview_path = modcore.get_preview_path(unquote(char), unquote(mod), request.args.get('root'))
     if not preview_path:
         return '', 404
     ext = os.path.splitext(preview_path)[1].lower()
@@ -271,41 +124,7 @@ def get_mods():
     char_name = request.args.get('char')
     if not char_name:
         return jsonify([])
-    mods_root = get_mods_root()
-    char_path = os.path.join(mods_root, char_name)
-    if not os.path.exists(char_path) or not os.path.isdir(char_path):
-        return jsonify([])
-    
-    favorites = load_favorites()
-    mods = []
-    for folder in os.listdir(char_path):
-        full_path = os.path.join(char_path, folder)
-        if not os.path.isdir(full_path):
-            continue
-        is_disabled = folder.startswith("DISABLED_")
-        has_preview = find_preview_path(full_path) is not None
-        preview_url = f"/api/preview?char={quote(char_name)}&mod={quote(folder)}" if has_preview else None
-        clean_name = folder.replace("DISABLED_", "", 1) if is_disabled else folder
-        mod_key = f"{char_name}:{folder}"
-        is_favorite = favorites.get(mod_key, False)
-        
-        # Check for txt files (readme, description, etc.)
-        has_readme = False
-        for item in os.listdir(full_path):
-            if item.lower().endswith('.txt'):
-                has_readme = True
-                break
-        
-        mods.append({
-            "name": folder,
-            "clean_name": clean_name,
-            "disabled": is_disabled,
-            "path": folder,
-            "preview_url": preview_url,
-            "favorite": is_favorite,
-            "has_readme": has_readme,
-        })
-    return jsonify(mods)
+    return jsonify(modcore.list_mods(char_name))
 
 @app.route('/api/get_readme', methods=['GET'])
 def get_readme():
@@ -313,35 +132,11 @@ def get_readme():
     mod = request.args.get('mod')
     if not char or not mod:
         return jsonify({"status": "error", "message": "Missing parameters"}), 400
-    
-    char = unquote(char)
-    mod = unquote(mod)
-    mod_path = os.path.join(get_mods_root(), char, mod)
-    
-    if not os.path.isdir(mod_path):
-        return jsonify({"status": "error", "message": "MOD not found"}), 404
-    
-    # Find txt file
-    txt_file = None
-    for item in os.listdir(mod_path):
-        if item.lower().endswith('.txt'):
-            txt_file = os.path.join(mod_path, item)
-            break
-    
-    if not txt_file:
-        return jsonify({"status": "error", "message": "No readme found"}), 404
-    
     try:
-        with open(txt_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-        return jsonify({"status": "success", "content": content, "filename": os.path.basename(txt_file)})
-    except Exception as e:
-        try:
-            with open(txt_file, 'r', encoding='gbk') as f:
-                content = f.read()
-            return jsonify({"status": "success", "content": content, "filename": os.path.basename(txt_file)})
-        except Exception as e2:
-            return jsonify({"status": "error", "message": str(e2)}), 500
+        readme = modcore.get_readme(unquote(char), unquote(mod), request.args.get('root'))
+    except ModError as e:
+        return jsonify({"status": "error", "message": e.message}), e.status
+    return jsonify({"status": "success", "content": readme["content"], "filename": readme["filename"]})
 
 @app.route('/api/toggle_favorite', methods=['POST'])
 def toggle_favorite():
@@ -350,61 +145,39 @@ def toggle_favorite():
     mod = data.get('mod')
     if not char or not mod:
         return jsonify({"status": "error", "message": "Missing parameters"}), 400
-    
-    favorites = load_favorites()
-    mod_key = f"{char}:{mod}"
-    
-    if mod_key in favorites:
-        del favorites[mod_key]
-        is_favorite = False
-    else:
-        favorites[mod_key] = True
-        is_favorite = True
-    
-    save_favorites(favorites)
-    return jsonify({"status": "success", "favorite": is_favorite})
+    try:
+        favorite = modcore.toggle_favorite(char, mod, data.get('root'))
+    except ModError as e:
+        return jsonify({"status": "error", "message": e.message}), e.status
+    return jsonify({"status": "success", "favorite": favorite})
 
 @app.route('/api/toggle', methods=['POST'])
 def toggle_mod():
     data = request.json or {}
-    char = data.get('char')
-    mod_name = data.get('mod', '')
-    action = data.get('action')
-    if not char or not action:
-        return jsonify({"status": "error", "message": "Missing parameters"}), 400
-    mods_root = get_mods_root()
-    char_path = os.path.join(mods_root, char)
-    if not os.path.isdir(char_path):
-        return jsonify({"status": "error", "message": "Character directory not found"}), 404
-    def rename_mod(current_name, target_state):
-        src = os.path.join(char_path, current_name)
-        if not os.path.isdir(src):
-            return
-        is_disabled = current_name.startswith("DISABLED_")
-        if target_state == 'disable' and not is_disabled:
-            dst = os.path.join(char_path, f"DISABLED_{current_name}")
-            if not os.path.exists(dst):
-                os.rename(src, dst)
-        elif target_state == 'enable' and is_disabled:
-            new_name = current_name.replace("DISABLED_", "", 1)
-            dst = os.path.join(char_path, new_name)
-            if not os.path.exists(dst):
-                os.rename(src, dst)
-    if action == 'enable':
-        all_dirs = [d for d in os.listdir(char_path) if os.path.isdir(os.path.join(char_path, d))]
-        for d in all_dirs:
-            rename_mod(d, 'disable')
-        rename_mod(mod_name, 'enable')
-    elif action == 'disable':
-        rename_mod(mod_name, action)
-    elif action == 'enable_all':
-        for m in os.listdir(char_path):
-            rename_mod(m, 'enable')
-    elif action == 'disable_all':
-        for m in os.listdir(char_path):
-            rename_mod(m, 'disable')
+    try:
+        modcore.toggle_mod(data.get('char'), data.get('mod', ''), data.get('action'),
+                           root_name=data.get('root'), force=bool(data.get('force')))
+    except ModConflictError as e:
+        return jsonify({"status": "conflict", "message": e.message, "conflicts": e.conflicts}), e.status
+    except ModError as e:
+        return jsonify({"status": "error", "message": e.message}), e.status
     return jsonify({"status": "success"})
 
+@app.route('/api/conflicts', methods=['GET'])
+def get_conflicts():
+    return jsonify({"status": "success", "conflicts": modcore.current_conflicts()})
+
+@app.route('/api/root_stats', methods=['GET'])
+def root_stats():
+    return jsonify(modcore.get_root_stats())
+
+@app.route('/api/archive_sweep', methods=['POST'])
+def trigger_archive_sweep():
+    if not CONFIG.get('archive_enabled'):
+        return jsonify({"status": "error", "message": "Archive is disabled"}), 400
+    threading.Thread(target=sweep_archive, args=(lambda: server_shutdown,), daemon=True).start()
+    return jsonify({"status": "started"})
+
 @app.route('/api/shutdown', methods=['POST'])
 def shutdown_server():
     global server_shutdown
@@ -572,6 +345,10 @@ if __name__ == '__main__':
             import webbrowser
             webbrowser.open(url)
     
+    threading.Thread(target=refresh_ini_index, daemon=True).start()
+    if CONFIG.get('archive_enabled'):
+        threading.Thread(target=archive_worker, args=(lambda: server_shutdown,), daemon=True).start()
+
     if not is_frozen() and DEBUG:
         run_server()
     else:
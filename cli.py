@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Headless command line interface for scripted mod operations.
+
+Runs the same operations as the web UI without starting Flask or a browser:
+
+    python cli.py list [CHAR]
+    python cli.py enable CHAR MOD [--root ROOT] [--force]
+    python cli.py enable CHAR --all
+    python cli.py disable CHAR MOD [--root ROOT]
+    python cli.py disable CHAR --all
+    python cli.py sync
+    python cli.py search QUERY [--char CHAR]
+    python cli.py reconcile [--dry-run]
+
+Add --json for machine-readable output. Exit codes: 0 success, 1 error,
+3 hash override conflict.
+"""
+import sys
+import json
+import argparse
+
+EXIT_ERROR = 1
+EXIT_CONFLICT = 3
+
+
+def _print_json(data):
+    json.dump(data, sys.stdout, ensure_ascii=False)
+    sys.stdout.write('\n')
+
+
+def _print_error(args, message):
+    if args.json:
+        _print_json({"status": "error", "message": message})
+    else:
+        print(f"error: {message}", file=sys.stderr)
+
+
+def _mod_state(mod):
+    if mod.get('archived'):
+        return 'archived'
+    return 'disabled' if mod['disabled'] else 'enabled'
+
+
+def cmd_list(args):
+    import modcore
+    if args.char:
+        mods = modcore.list_mods(args.char)
+        if args.json:
+            _print_json(mods)
+            return 0
+        for mod in mods:
+            print(f"{_mod_state(mod):<9} [{mod['root']}] {mod['clean_name']}")
+        return 0
+    chars = modcore.list_chars()
+    if args.json:
+        _print_json(chars)
+        return 0
+    for char in chars:
+        print(f"{char['mod_count']:>4}  {char['name']}  ({', '.join(char['roots'])})")
+    return 0
+
+
+def _toggle(args, single_action):
+    import modcore
+    if args.all:
+        action, mod = f"{single_action}_all", ''
+    elif args.mod:
+        action, mod = single_action, args.mod
+        # Accept the clean name as well as the on-disk folder name
+        if single_action == 'enable' and not mod.startswith("DISABLED_"):
+            if not modcore.find_mod_dir(args.char, mod, args.root)[1]:
+                mod = f"DISABLED_{mod}"
+        elif single_action == 'disable' and mod.startswith("DISABLED_"):
+            mod = mod.replace("DISABLED_", "", 1)
+    else:
+        _print_error(args, "MOD or --all is required")
+        return EXIT_ERROR
+    try:
+        modcore.toggle_mod(args.char, mod, action, root_name=args.root, force=getattr(args, 'force', False))
+    except modcore.ModConflictError as e:
+        if args.json:
+            _print_json({"status": "conflict", "message": e.message, "conflicts": e.conflicts})
+        else:
+            print(f"error: {e.message}", file=sys.stderr)
+            for conflict in e.conflicts:
+                owners = ', '.join(f"[{m['root']}] {m['char']}/{m['mod']}" for m in conflict['mods'])
+                print(f"  {conflict['hash']}: {owners}", file=sys.stderr)
+        return EXIT_CONFLICT
+    if args.json:
+        _print_json({"status": "success", "action": action, "char": args.char, "mod": mod})
+    return 0
+
+
+def cmd_enable(args):
+    return _toggle(args, 'enable')
+
+
+def cmd_disable(args):
+    return _toggle(args, 'disable')
+
+
+def cmd_sync(args):
+    import modcore
+    try:
+        saved_chars = modcore.sync_chars()
+    except Exception as e:
+        _print_error(args, str(e))
+        return EXIT_ERROR
+    if args.json:
+        _print_json({"status": "success", "count": len(saved_chars), "chars": saved_chars})
+    else:
+        print(f"Synced {len(saved_chars)} characters")
+    return 0
+
+
+def cmd_search(args):
+    import modcore
+    results = modcore.search_mods(args.query, char=args.char)
+    if args.json:
+        _print_json(results)
+        return 0
+    for mod in results:
+        print(f"{_mod_state(mod):<9} [{mod['root']}] {mod['char']}/{mod['clean_name']}")
+    return 0
+
+
+def cmd_reconcile(args):
+    import modcore
+    report = modcore.reconcile(dry_run=args.dry_run)
+    if args.json:
+        _print_json(report)
+        return 0
+    prefix = "Would remove" if args.dry_run else "Removed"
+    for path in report['removed_restoring']:
+        print(f"{prefix} interrupted restore: {path}")
+    for key in report['pruned_archive_entries']:
+        print(f"{prefix} archive entry without zip: {key}")
+    for path in report['orphan_archive_files']:
+        print(f"{'Would quarantine' if args.dry_run else 'Quarantined'} archive file without entry: {path}")
+    for key in report['pruned_favorites']:
+        print(f"{prefix} favorite of missing mod: {key}")
+    for name in report['skipped_roots']:
+        print(f"Skipped library root that could not be scanned: {name}")
+    for char, mods in report['multi_enabled'].items():
+        print(f"Multiple enabled mods for {char}: {', '.join(mods)}")
+    for conflict in report['conflicts']:
+        owners = ', '.join(f"[{m['root']}] {m['char']}/{m['mod']}" for m in conflict['mods'])
+        print(f"Hash conflict {conflict['hash']}: {owners}")
+    if not any(report.values()):
+        print("Nothing to reconcile")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='cli.py', description='Mod Manager command line interface')
+    parser.add_argument('--json', action='store_true', help='print machine-readable JSON')
+    # Also accept --json after the subcommand without overriding the global flag
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--json', action='store_true', default=argparse.SUPPRESS, help='print machine-readable JSON')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('list', parents=[common], help='list characters, or the mods of one character')
+    p.add_argument('char', nargs='?')
+    p.set_defaults(func=cmd_list)
+
+    for name, func, help_text in (('enable', cmd_enable, 'enable a mod (disables the others of the character)'),
+                                  ('disable', cmd_disable, 'disable a mod')):
+        p = sub.add_parser(name, parents=[common], help=help_text)
+        p.add_argument('char')
+        p.add_argument('mod', nargs='?')
+        p.add_argument('--all', action='store_true', help=f'{name} every mod of the character')
+        p.add_argument('--root', help='library root that owns the mod')
+        if name == 'enable':
+            p.add_argument('--force', action='store_true', help='enable despite hash override conflicts')
+        p.set_defaults(func=func)
+
+    p = sub.add_parser('sync', parents=[common], help='sync the character list from the wiki API')
+    p.set_defaults(func=cmd_sync)
+
+    p = sub.add_parser('search', parents=[common], help='search mods by name across all characters')
+    p.add_argument('query')
+    p.add_argument('--char', help='only search this character')
+    p.set_defaults(func=cmd_search)
+
+    p = sub.add_parser('reconcile', parents=[common], help='clean up stale state and report problems')
+    p.add_argument('--dry-run', action='store_true', help='report only, change nothing')
+    p.set_defaults(func=cmd_reconcile)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    import modcore
+    # One place for failures, so every command keeps the exit codes and --json
+    try:
+        return args.func(args)
+    except modcore.ModError as e:
+        _print_error(args, e.message)
+    except OSError as e:
+        # e.g. a mod folder locked by the running game
+        _print_error(args, str(e))
+    return EXIT_ERROR
+
+
+if __name__ == '__main__':
+    sys.exit(main())
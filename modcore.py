@@ -0,0 +1,1643 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Core mod library operations shared by the web app and the CLI.
+
+Importing this module has no side effects: it does not create directories,
+start Flask or install signal handlers. Heavy dependencies are imported
+inside the functions that need them.
+"""
+import os
+import re
+import sys
+import time
+import json
+import shutil
+import hashlib
+import zipfile
+import contextlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+
+class ModError(Exception):
+    """An operation failed; `status` mirrors the HTTP status the API returns."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class ModConflictError(ModError):
+    def __init__(self, conflicts):
+        super().__init__("Hash override conflict", 409)
+        self.conflicts = conflicts
+
+
+def is_frozen():
+    return getattr(sys, 'frozen', False)
+
+
+def get_exe_dir():
+    if is_frozen():
+        return os.path.dirname(os.path.realpath(sys.executable))
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+def get_base_dir():
+    return get_exe_dir()
+
+
+DEFAULT_CONFIG = {
+    "app_title": "Mod Manager",
+    "app_name": "Mod Manager",
+    "icon_path": "icon.png"
+}
+
+def load_config():
+    config_path = os.path.join(get_base_dir(), 'config.json')
+    if os.path.exists(config_path):
+        try:
+            with open(config_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except:
+            pass
+    return DEFAULT_CONFIG.copy()
+
+def save_config(config):
+    config_path = os.path.join(get_base_dir(), 'config.json')
+    try:
+        with open(config_path, 'w', encoding='utf-8') as f:
+            json.dump(config, f, ensure_ascii=False, indent=4)
+        return True
+    except Exception as e:
+        print(f"Failed to save config: {e}")
+        return False
+
+CONFIG = load_config()
+
+# Favorites storage
+FAVORITES_FILE = os.path.join(get_base_dir(), 'favorites.json')
+
+def load_favorites():
+    if os.path.exists(FAVORITES_FILE):
+        try:
+            with open(FAVORITES_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except:
+            pass
+    return {}
+
+def favorite_key(root_name, char, folder):
+    return f"{root_name}|{char}:{folder}"
+
+def is_favorite(favorites, root_name, char, folder):
+    # Keys without a root predate multiple library roots and still count
+    key = favorite_key(root_name, char, folder)
+    if key in favorites:
+        return bool(favorites[key])
+    return bool(favorites.get(f"{char}:{folder}", False))
+
+def save_favorites(favorites):
+    try:
+        with open(FAVORITES_FILE, 'w', encoding='utf-8') as f:
+            json.dump(favorites, f, ensure_ascii=False, indent=4)
+        return True
+    except Exception as e:
+        print(f"Failed to save favorites: {e}")
+        return False
+
+
+def get_mod_roots():
+    """Return the configured mod library roots as [{"name": ..., "path": ...}].
+
+    Roots come from the `mod_roots` list in config.json. Entries are either a
+    path string or a {"name", "path"} object; relative paths resolve against
+    the base dir. The first root is the primary one. Defaults to `mods/`.
+    """
+    roots = []
+    names = set()
+    for i, entry in enumerate(CONFIG.get('mod_roots') or []):
+        if isinstance(entry, dict):
+            name, path = entry.get('name'), entry.get('path')
+        else:
+            name, path = None, entry
+        if not path or not isinstance(path, str):
+            continue
+        if not os.path.isabs(path):
+            path = os.path.join(get_base_dir(), path)
+        path = os.path.normpath(path)
+        name = str(name or os.path.basename(path) or f"root{i}")
+        if name in names:
+            name = f"{name}_{i}"
+        names.add(name)
+        roots.append({"name": name, "path": path})
+    if not roots:
+        roots.append({"name": "default", "path": os.path.join(get_base_dir(), 'mods')})
+    return roots
+
+
+def get_mods_root():
+    return get_mod_roots()[0]['path']
+
+
+def get_root_path(root_name):
+    for root in get_mod_roots():
+        if root['name'] == root_name:
+            return root['path']
+    return None
+
+
+def get_chars_img_dir():
+    return os.path.join(get_base_dir(), 'static', 'chars')
+
+
+def get_resource_dir():
+    if is_frozen():
+        meipass = getattr(sys, '_MEIPASS', None)
+        if meipass:
+            return meipass
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+def sanitize_filename(name):
+    return re.sub(r'[\\/:*?"<>|]', '_', name).strip() or 'unnamed'
+
+PREVIEW_NAMES = ('preview.png', 'preview.jpg', 'preview.jpeg')
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp', '.ico'}
+
+def find_preview_path(dir_path):
+    for name in PREVIEW_NAMES:
+        p = os.path.join(dir_path, name)
+        if os.path.isfile(p):
+            return p
+    try:
+        for item in os.listdir(dir_path):
+            item_path = os.path.join(dir_path, item)
+            if os.path.isfile(item_path):
+                _, ext = os.path.splitext(item.lower())
+                if ext in IMAGE_EXTENSIONS and item.lower() not in PREVIEW_NAMES:
+                    return item_path
+    except OSError:
+        pass
+    return None
+
+# Per-root scan timings, exposed through /api/root_stats
+_root_scan_stats = {}
+_root_scan_lock = threading.Lock()
+# root name -> {token: start time} of scans still running, to spot hung roots
+_root_scans_running = {}
+DEFAULT_ROOT_SCAN_TIMEOUT = 3.0
+
+
+def _root_stats_entry(root):
+    stats = _root_scan_stats.setdefault(root['name'], {"scans": 0, "total_ms": 0.0, "max_ms": 0.0, "timeouts": 0})
+    stats["path"] = root['path']
+    return stats
+
+
+def scan_roots(scan_fn, roots=None, timeout=None):
+    """Run scan_fn(root) on every library root, each root on its own worker.
+
+    Returns [(root, result, complete)] in root order. `complete` is False
+    when there is no data for the root, which callers must not read as "no
+    mods": the root raised OSError (e.g. an unplugged drive, the error is
+    recorded), did not answer within `timeout` seconds (`root_scan_timeout`
+    in config.json, the root is marked `timed_out`), or was skipped because
+    an earlier scan of it is still overdue. A slow root thus never holds up
+    the others, and hung roots do not pile up more workers.
+    """
+    roots = roots or get_mod_roots()
+    if timeout is None:
+        timeout = float(CONFIG.get('root_scan_timeout', DEFAULT_ROOT_SCAN_TIMEOUT))
+    results = {}
+
+    def run(root, token):
+        start = time.perf_counter()
+        result, error = None, None
+        try:
+            result = scan_fn(root)
+        except OSError as e:
+            error = str(e)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with _root_scan_lock:
+            results[root['name']] = (result, error is None)
+            running = _root_scans_running.get(root['name'])
+            if running:
+                running.pop(token, None)
+                if not running:
+                    del _root_scans_running[root['name']]
+            stats = _root_stats_entry(root)
+            stats["scans"] += 1
+            stats["last_ms"] = round(elapsed_ms, 2)
+            stats["total_ms"] = round(stats["total_ms"] + elapsed_ms, 2)
+            stats["max_ms"] = round(max(stats["max_ms"], elapsed_ms), 2)
+            stats["error"] = error
+
+    # Daemon threads rather than a pool: a hung root must not block exit either
+    threads = []
+    now = time.monotonic()
+    for root in roots:
+        with _root_scan_lock:
+            running = _root_scans_running.setdefault(root['name'], {})
+            if any(now - started > timeout for started in running.values()):
+                continue
+            token = object()
+            running[token] = now
+        thread = threading.Thread(target=run, args=(root, token), daemon=True)
+        thread.start()
+        threads.append(thread)
+    deadline = now + timeout
+    for thread in threads:
+        thread.join(max(0.0, deadline - time.monotonic()))
+
+    scanned = []
+    with _root_scan_lock:
+        for root in roots:
+            stats = _root_stats_entry(root)
+            if root['name'] in results:
+                stats["timed_out"] = False
+                scanned.append((root, *results[root['name']]))
+            else:
+                stats["timed_out"] = True
+                stats["timeouts"] += 1
+                scanned.append((root, None, False))
+    return scanned
+
+
+def get_char_dirs(char):
+    """Return [(root_name, char_path)] for every root that has this character."""
+    dirs = []
+    for root in get_mod_roots():
+        char_path = os.path.join(root['path'], char)
+        if os.path.isdir(char_path):
+            dirs.append((root['name'], char_path))
+    return dirs
+
+
+def find_mod_dir(char, mod, root_name=None):
+    """Locate a mod folder in `root_name`, or in the first root that has it."""
+    for root in get_mod_roots():
+        if root_name and root['name'] != root_name:
+            continue
+        mod_dir = os.path.join(root['path'], char, mod)
+        if os.path.isdir(mod_dir):
+            return root['name'], mod_dir
+    return None, None
+
+
+# 3DMigoto .ini hash-override index
+# XXMI/3DMigoto ignores any file or folder whose name starts with "DISABLED"
+HASH_LINE_RE = re.compile(r'^\s*hash\s*=\s*([0-9a-fA-F]+)', re.IGNORECASE)
+INI_INDEX_WORKERS = min(8, (os.cpu_count() or 4))
+
+# (root, char, clean_name, rel_path) -> (mtime, size, frozenset(hashes))
+_ini_file_cache = {}
+# (root, char, clean_name) -> set(hashes)
+_mod_hashes = {}
+# hash -> set((root, char, clean_name))
+_hash_index = {}
+# (root, char, clean_name) -> folder name on disk; the enabled set comes from here
+_mod_folders = {}
+# Roots whose mod folders have all been indexed at least once
+_indexed_roots = set()
+_ini_index_lock = threading.Lock()
+
+# The index is persisted so the CLI and restarts only re-parse changed files
+INI_CACHE_FILE = os.path.join(get_base_dir(), 'ini_cache.json')
+_ini_cache_loaded = False
+_ini_cache_dirty = False
+# (mtime_ns, size) of the cache file as last loaded or saved by this process
+_ini_cache_stamp = None
+
+
+def _clean_mod_name(folder):
+    return folder.replace("DISABLED_", "", 1) if folder.startswith("DISABLED_") else folder
+
+
+def parse_ini_hashes(ini_path):
+    """Return the set of override hashes declared in a 3DMigoto .ini file."""
+    hashes = set()
+    section = None
+    try:
+        with open(ini_path, 'r', encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith(';'):
+                    continue
+                if line.startswith('[') and line.endswith(']'):
+                    section = line[1:-1].strip().lower()
+                    continue
+                if section is None:
+                    continue
+                if section.startswith('textureoverride') or section.startswith('shaderoverride'):
+                    m = HASH_LINE_RE.match(line)
+                    if m:
+                        hashes.add(m.group(1).lower())
+    except OSError:
+        pass
+    return hashes
+
+
+def _list_mod_inis(mod_dir):
+    """Yield paths (relative to mod_dir) of .ini files the loader would read."""
+    for root, dirs, files in os.walk(mod_dir):
+        dirs[:] = [d for d in dirs if not d.lower().startswith('disabled')]
+        for name in files:
+            if name.lower().endswith('.ini') and not name.lower().startswith('disabled'):
+                yield os.path.relpath(os.path.join(root, name), mod_dir)
+
+
+def _cache_stamp():
+    try:
+        st = os.stat(INI_CACHE_FILE)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _load_ini_cache():
+    """Load the persisted index, and reload it whenever another process saved it.
+
+    The CLI and the web server each keep the enabled set up to date for their
+    own toggles; reloading picks up the other one's. Caller holds
+    _ini_index_lock.
+    """
+    global _ini_cache_loaded, _ini_cache_stamp
+    stamp = _cache_stamp()
+    if _ini_cache_loaded and (stamp == _ini_cache_stamp or _ini_cache_dirty):
+        return
+    _ini_cache_loaded = True
+    _ini_cache_stamp = stamp
+    if stamp is None:
+        return
+    try:
+        with open(INI_CACHE_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data, list):
+            # Written before mod folders were tracked; a full refresh fills them in
+            data = {"files": data}
+        files = {}
+        for root_name, char, clean, rel, mtime, size, hashes in data.get('files', []):
+            files[(root_name, char, clean, rel)] = (mtime, size, frozenset(hashes))
+        folders = {(root_name, char, clean): folder for root_name, char, clean, folder in data.get('mods', [])}
+        indexed_roots = set(data.get('indexed_roots', []))
+    except (OSError, ValueError, TypeError, AttributeError):
+        # Only a cache: anything unreadable is simply re-parsed
+        return
+    mod_hashes = {mod_key: set() for mod_key in folders}
+    for (root_name, char, clean, _), (_, _, hashes) in files.items():
+        if (root_name, char, clean) in mod_hashes:
+            mod_hashes[(root_name, char, clean)].update(hashes)
+    _ini_file_cache.clear()
+    _ini_file_cache.update(files)
+    _mod_folders.clear()
+    _mod_folders.update(folders)
+    _indexed_roots.clear()
+    _indexed_roots.update(indexed_roots)
+    _mod_hashes.clear()
+    _hash_index.clear()
+    for mod_key, hashes in mod_hashes.items():
+        _set_mod_hashes(mod_key, hashes)
+
+
+def save_ini_cache():
+    global _ini_cache_dirty, _ini_cache_stamp
+    with _ini_index_lock:
+        if not _ini_cache_dirty:
+            return True
+        data = {
+            "files": [[*key, mtime, size, sorted(hashes)] for key, (mtime, size, hashes) in _ini_file_cache.items()],
+            "mods": [[*key, folder] for key, folder in _mod_folders.items()],
+            "indexed_roots": sorted(_indexed_roots),
+        }
+        tmp_path = f"{INI_CACHE_FILE}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, INI_CACHE_FILE)
+        except Exception as e:
+            print(f"Failed to save ini cache: {e}")
+            return False
+        _ini_cache_dirty = False
+        _ini_cache_stamp = _cache_stamp()
+        return True
+
+
+def _stat_ini(key, full):
+    """Return the hashes of one .ini file, parsing it only if mtime/size changed.
+
+    Returns None if the file is gone.
+    """
+    global _ini_cache_dirty
+    try:
+        st = os.stat(full)
+    except OSError:
+        return None
+    cached = _ini_file_cache.get(key)
+    if cached and cached[0] == st.st_mtime and cached[1] == st.st_size:
+        return cached[2]
+    file_hashes = frozenset(parse_ini_hashes(full))
+    _ini_file_cache[key] = (st.st_mtime, st.st_size, file_hashes)
+    _ini_cache_dirty = True
+    return file_hashes
+
+
+def _index_mod_files(root_name, char, folder, mod_dir):
+    """Find the .ini files of one mod and re-parse only those that changed."""
+    clean = _clean_mod_name(folder)
+    hashes = set()
+    seen = set()
+    for rel in _list_mod_inis(mod_dir):
+        key = (root_name, char, clean, rel)
+        file_hashes = _stat_ini(key, os.path.join(mod_dir, rel))
+        if file_hashes is not None:
+            seen.add(key)
+            hashes.update(file_hashes)
+    return (root_name, char, clean), hashes, seen
+
+
+def _set_mod_hashes(mod_key, hashes):
+    old = _mod_hashes.get(mod_key, set())
+    for h in old - hashes:
+        owners = _hash_index.get(h)
+        if owners:
+            owners.discard(mod_key)
+            if not owners:
+                del _hash_index[h]
+    for h in hashes - old:
+        _hash_index.setdefault(h, set()).add(mod_key)
+    _mod_hashes[mod_key] = hashes
+
+
+def _set_mod_folder(mod_key, folder):
+    global _ini_cache_dirty
+    if _mod_folders.get(mod_key) != folder:
+        _mod_folders[mod_key] = folder
+        _ini_cache_dirty = True
+
+
+def _forget_mod(mod_key):
+    """Drop a mod that no longer exists from the index; caller holds _ini_index_lock."""
+    global _ini_cache_dirty
+    _set_mod_hashes(mod_key, set())
+    _mod_hashes.pop(mod_key, None)
+    _mod_folders.pop(mod_key, None)
+    for key in [k for k in _ini_file_cache if k[:3] == mod_key]:
+        del _ini_file_cache[key]
+    _ini_cache_dirty = True
+
+
+def _iter_mod_dirs(root):
+    """Return (char, folder, mod_dir) for every mod folder under a library root.
+
+    A missing root raises OSError rather than returning an empty list.
+    """
+    found = []
+    for char in os.listdir(root['path']):
+        char_path = os.path.join(root['path'], char)
+        if not os.path.isdir(char_path):
+            continue
+        for folder in os.listdir(char_path):
+            mod_dir = os.path.join(char_path, folder)
+            if os.path.isdir(mod_dir):
+                found.append((char, folder, mod_dir))
+    return found
+
+
+def _refresh_mods(jobs):
+    """Re-index (root, char, folder, mod_dir) jobs on the thread pool.
+
+    Every .ini file is stat'ed but only changed ones are parsed. Caller holds
+    _ini_index_lock.
+    """
+    global _ini_cache_dirty
+    _load_ini_cache()
+    if not jobs:
+        return []
+    with ThreadPoolExecutor(max_workers=INI_INDEX_WORKERS) as pool:
+        results = list(pool.map(lambda job: _index_mod_files(*job), jobs))
+    all_seen = set()
+    for (_, _, folder, _), (mod_key, hashes, seen) in zip(jobs, results):
+        _set_mod_hashes(mod_key, hashes)
+        _set_mod_folder(mod_key, folder)
+        all_seen.update(seen)
+    # .ini files deleted from the re-indexed mods
+    refreshed = {mod_key for mod_key, _, _ in results}
+    for key in [k for k in _ini_file_cache if k[:3] in refreshed and k not in all_seen]:
+        del _ini_file_cache[key]
+        _ini_cache_dirty = True
+    return results
+
+
+def refresh_ini_index():
+    """Incrementally rebuild the hash -> mods index across all mod folders.
+
+    Roots whose scan did not complete keep their existing entries, so a
+    spun-down disk neither drops out of conflict checks nor has to be
+    re-parsed from scratch once it answers again.
+    """
+    global _ini_cache_dirty
+    jobs = []
+    complete = set()
+    for root, mod_dirs, ok in scan_roots(_iter_mod_dirs):
+        if not ok:
+            continue
+        complete.add(root['name'])
+        for char, folder, mod_dir in mod_dirs:
+            jobs.append((root['name'], char, folder, mod_dir))
+    configured = {root['name'] for root in get_mod_roots()}
+    with _ini_index_lock:
+        results = _refresh_mods(jobs)
+        live_mods = {mod_key for mod_key, _, _ in results}
+
+        def stale(mod_key):
+            # Only what a complete scan did not see, or roots no longer configured
+            return mod_key not in live_mods and (mod_key[0] in complete or mod_key[0] not in configured)
+
+        for mod_key in [k for k in set(_mod_hashes) | set(_mod_folders) if stale(k)]:
+            _forget_mod(mod_key)
+        for key in [k for k in _ini_file_cache if stale(k[:3])]:
+            del _ini_file_cache[key]
+            _ini_cache_dirty = True
+        if (complete | (_indexed_roots & configured)) != _indexed_roots:
+            _indexed_roots.intersection_update(configured)
+            _indexed_roots.update(complete)
+            _ini_cache_dirty = True
+    save_ini_cache()
+    return len(results)
+
+
+def refresh_mods_index(mods):
+    """Bring the index entries of (root, char, folder) mods up to date."""
+    jobs = []
+    for root_name, char, folder in mods:
+        root_path = get_root_path(root_name)
+        if root_path is None:
+            continue
+        mod_dir = os.path.join(root_path, char, folder)
+        if os.path.isdir(mod_dir):
+            jobs.append((root_name, char, folder, mod_dir))
+    with _ini_index_lock:
+        _refresh_mods(jobs)
+    save_ini_cache()
+
+
+def note_mod_renamed(root_name, char, folder):
+    """Record in the index that a mod folder now has this name (enabled or not)."""
+    with _ini_index_lock:
+        _load_ini_cache()
+        _set_mod_folder((root_name, char, _clean_mod_name(folder)), folder)
+
+
+def _unindexed_roots():
+    """Roots the index cannot vouch for; caller holds _ini_index_lock."""
+    return [root['name'] for root in get_mod_roots()
+            if root['name'] not in _indexed_roots or not os.path.isdir(root['path'])]
+
+
+def _check_enabled_folders():
+    """Stat the folder of every indexed enabled mod and return the ones still there.
+
+    Catches renames and deletions made outside this app without listing any
+    directory. Caller holds _ini_index_lock.
+    """
+    enabled = set()
+    for mod_key, folder in list(_mod_folders.items()):
+        if folder.startswith("DISABLED_"):
+            continue
+        root_path = get_root_path(mod_key[0])
+        char_path = os.path.join(root_path, mod_key[1]) if root_path else None
+        if char_path and os.path.isdir(os.path.join(char_path, folder)):
+            enabled.add(mod_key)
+        elif char_path and os.path.isdir(os.path.join(char_path, f"DISABLED_{folder}")):
+            _set_mod_folder(mod_key, f"DISABLED_{folder}")
+        else:
+            _forget_mod(mod_key)
+    return enabled
+
+
+def _restat_mods(mod_keys):
+    """Re-stat the cached .ini files of indexed mods, re-parsing edited ones.
+
+    Unlike _refresh_mods this never walks a mod folder, so .ini files added
+    since the last refresh are only picked up by refresh_ini_index. Caller
+    holds _ini_index_lock.
+    """
+    global _ini_cache_dirty
+    cached = {}
+    for key in _ini_file_cache:
+        if key[:3] in mod_keys:
+            cached.setdefault(key[:3], []).append(key)
+    if not cached:
+        return
+
+    def restat(mod_key):
+        mod_dir = os.path.join(get_root_path(mod_key[0]), mod_key[1], _mod_folders[mod_key])
+        files = [(key, _stat_ini(key, os.path.join(mod_dir, key[3]))) for key in cached[mod_key]]
+        return mod_key, files
+
+    with ThreadPoolExecutor(max_workers=INI_INDEX_WORKERS) as pool:
+        results = list(pool.map(restat, [k for k in cached if k in _mod_folders and get_root_path(k[0])]))
+    for mod_key, files in results:
+        hashes = set()
+        for key, file_hashes in files:
+            if file_hashes is None:
+                del _ini_file_cache[key]
+                _ini_cache_dirty = True
+            else:
+                hashes.update(file_hashes)
+        _set_mod_hashes(mod_key, hashes)
+
+
+def get_enabled_mods():
+    """Return the set of (root, char, clean_name) the index has as enabled."""
+    with _ini_index_lock:
+        _load_ini_cache()
+        return {k for k, folder in _mod_folders.items() if not folder.startswith("DISABLED_")}
+
+
+def find_conflicts(enabled, only=None, extra=None):
+    """Report hashes overridden by more than one mod in `enabled`.
+
+    If `only` is given, restrict the report to conflicts involving those mods.
+    `extra` maps mods that are not on disk (archived ones) to their hashes.
+    Answered entirely from the index.
+    """
+    extra = extra or {}
+    conflicts = {}
+    with _ini_index_lock:
+        candidates = only if only is not None else enabled
+        for mod_key in candidates:
+            hashes = extra[mod_key] if mod_key in extra else _mod_hashes.get(mod_key, ())
+            for h in hashes:
+                owners = _hash_index.get(h, set()) & enabled
+                owners |= {k for k, extra_hashes in extra.items() if k in enabled and h in extra_hashes}
+                if len(owners) > 1:
+                    conflicts[h] = owners
+    return [
+        {"hash": h, "mods": [{"root": r, "char": c, "mod": m} for r, c, m in sorted(owners)]}
+        for h, owners in sorted(conflicts.items())
+    ]
+
+
+def check_enable_conflicts(char, char_dirs, mod_name, mod_root, action, archived=()):
+    """Conflicts that enabling `mod_name` (or every mod for enable_all) would cause.
+
+    Answered from the index: only the targets are walked, and of the enabled
+    mods only their known .ini files are re-stat'ed. Archived mods in
+    `archived` are checked by the hashes stored in their archive entry, so
+    nothing has to be restored to find out. Fails closed with ModError(503)
+    while a library root has not been fully indexed, since its enabled mods
+    are unknown.
+    """
+    targets = []
+    for root_name, char_path in char_dirs:
+        for d in os.listdir(char_path):
+            if not os.path.isdir(os.path.join(char_path, d)):
+                continue
+            if action == 'enable_all' or (root_name == mod_root and d == mod_name):
+                targets.append((root_name, d))
+    if not targets and not archived:
+        return []
+    with _ini_index_lock:
+        _load_ini_cache()
+        missing = _unindexed_roots()
+    if missing:
+        # First use in this process, or a root that never answered: index it now
+        refresh_ini_index()
+        with _ini_index_lock:
+            missing = _unindexed_roots()
+        if missing:
+            raise ModError(f"Cannot check conflicts, library root not indexed: {', '.join(missing)}", 503)
+    refresh_mods_index([(r, char, f) for r, f in targets])
+    with _ini_index_lock:
+        enabled = _check_enabled_folders()
+        if action == 'enable':
+            enabled = {k for k in enabled if k[1] != char}
+        _restat_mods(enabled)
+    save_ini_cache()
+    to_enable = {(r, char, _clean_mod_name(f)) for r, f in targets}
+    extra = {(entry['root'], char, entry['clean_name']): set(entry.get('hashes') or ()) for entry in archived}
+    to_enable.update(extra)
+    return find_conflicts(enabled | to_enable, only=to_enable, extra=extra)
+
+
+# Cold storage for long-disabled mods
+ARCHIVE_INDEX_NAME = 'archive_index.json'
+ARCHIVE_LOCK_DIR = 'locks'
+# Archive files without an index entry are moved here by reconcile
+ARCHIVE_QUARANTINE_DIR = 'orphaned'
+ARCHIVE_CHUNK_SIZE = 1024 * 1024
+
+
+class ArchiveIndexError(ModError):
+    def __init__(self, message):
+        super().__init__(message, 500)
+
+
+class FileLock:
+    """Exclusive lock on a file, held against other threads and processes.
+
+    The web server and the CLI both touch the archive, so an in-process lock
+    is not enough. Each acquire opens its own handle, which makes two threads
+    of one process exclude each other as well.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def acquire(self, blocking=True):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        f = open(self.path, 'a+b')
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                while True:
+                    try:
+                        f.seek(0)
+                        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                        break
+                    except OSError:
+                        if not blocking:
+                            raise
+                        time.sleep(0.05)
+            else:
+                import fcntl
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except OSError:
+            f.close()
+            if blocking:
+                raise
+            return False
+        self._file = f
+        return True
+
+    def release(self):
+        f, self._file = self._file, None
+        if f is None:
+            return
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        finally:
+            f.close()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def get_archive_dir():
+    path = CONFIG.get('archive_dir') or 'mod_archive'
+    if not os.path.isabs(path):
+        path = os.path.join(get_base_dir(), path)
+    return os.path.normpath(path)
+
+
+def archive_in_use():
+    """Archiving is on, or was on and left an archive dir behind."""
+    return bool(CONFIG.get('archive_enabled')) or os.path.isdir(get_archive_dir())
+
+
+def _archive_key(root_name, char, clean_name):
+    return f"{root_name}|{char}|{clean_name}"
+
+
+def _archive_rel_base(root_name, char, clean_name):
+    """Path of a mod's zip inside the archive dir, without the extension."""
+    return os.path.join(sanitize_filename(root_name), sanitize_filename(char), sanitize_filename(clean_name))
+
+
+def _mod_lock_at(rel_base):
+    digest = hashlib.sha1(rel_base.replace(os.sep, '/').encode('utf-8')).hexdigest()
+    return FileLock(os.path.join(get_archive_dir(), ARCHIVE_LOCK_DIR, f"{digest}.lock"))
+
+
+def mod_lock(root_name, char, clean_name):
+    """Lock held while a mod is packed, restored or renamed out of DISABLED_."""
+    return _mod_lock_at(_archive_rel_base(root_name, char, clean_name))
+
+
+def _archive_file_lock(rel_path):
+    """Mod lock guarding an archive file, derived from its path in the archive dir."""
+    name = os.path.basename(rel_path)
+    if name.endswith('.zip'):
+        base = name[:-len('.zip')]
+    else:
+        base = name.rsplit('.preview', 1)[0]
+    return _mod_lock_at(os.path.join(os.path.dirname(rel_path), base))
+
+
+def _quarantine_archive_file(rel_path):
+    """Move an archive file out of the way, keeping its relative path."""
+    dst = os.path.join(get_archive_dir(), ARCHIVE_QUARANTINE_DIR, rel_path)
+    if os.path.exists(dst):
+        base, ext = os.path.splitext(dst)
+        dst = f"{base}.{int(time.time())}{ext}"
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    os.replace(os.path.join(get_archive_dir(), rel_path), dst)
+    return dst
+
+
+def _index_lock():
+    """Lock around every load-modify-save of the archive index."""
+    if not archive_in_use():
+        return contextlib.nullcontext()
+    return FileLock(os.path.join(get_archive_dir(), '.index.lock'))
+
+
+def load_archive_index():
+    """Read the archive index; raises ArchiveIndexError if it cannot be parsed.
+
+    A damaged index is never replaced by an empty one, since the next save
+    would drop every archived mod from the library.
+    """
+    index_path = os.path.join(get_archive_dir(), ARCHIVE_INDEX_NAME)
+    if not os.path.exists(index_path):
+        return {"archived": {}, "disabled_since": {}}
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ArchiveIndexError(f"Archive index is unreadable ({index_path}): {e}")
+    if not isinstance(index, dict):
+        raise ArchiveIndexError(f"Archive index is malformed: {index_path}")
+    index.setdefault('archived', {})
+    index.setdefault('disabled_since', {})
+    return index
+
+
+def save_archive_index(index):
+    index_path = os.path.join(get_archive_dir(), ARCHIVE_INDEX_NAME)
+    try:
+        os.makedirs(get_archive_dir(), exist_ok=True)
+        tmp_path = index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, index_path)
+        return True
+    except Exception as e:
+        print(f"Failed to save archive index: {e}")
+        return False
+
+
+def _update_archive_index(update):
+    """Apply update(index) under the index lock; returns whether it was saved."""
+    with _index_lock():
+        index = load_archive_index()
+        update(index)
+        return save_archive_index(index)
+
+
+def read_text_file(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except UnicodeDecodeError:
+        with open(path, 'r', encoding='gbk') as f:
+            return f.read()
+
+
+def find_readme_path(dir_path):
+    for item in os.listdir(dir_path):
+        if item.lower().endswith('.txt'):
+            return os.path.join(dir_path, item)
+    return None
+
+
+def get_archived_mods(char):
+    """Return archive index entries for a character."""
+    return [e for e in load_archive_index()['archived'].values() if e['char'] == char]
+
+
+def find_archived_mod(char, folder, root_name=None):
+    clean = _clean_mod_name(folder)
+    for entry in get_archived_mods(char):
+        if entry['clean_name'] == clean and (not root_name or entry['root'] == root_name):
+            return entry
+    return None
+
+
+def _is_inside(path, parent):
+    path = os.path.normcase(os.path.abspath(path))
+    parent = os.path.normcase(os.path.abspath(parent))
+    return path == parent or path.startswith(parent + os.sep)
+
+
+def _extract_zip(zip_path, dest_dir):
+    """Stream every member of a zip into dest_dir, skipping paths that escape it."""
+    with zipfile.ZipFile(zip_path) as zf:
+        for info in zf.infolist():
+            target = os.path.normpath(os.path.join(dest_dir, info.filename))
+            if not _is_inside(target, dest_dir):
+                continue
+            if info.is_dir():
+                os.makedirs(target, exist_ok=True)
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with zf.open(info) as src, open(target, 'wb') as out:
+                shutil.copyfileobj(src, out, ARCHIVE_CHUNK_SIZE)
+
+
+def _remove_archive_files(entry):
+    for rel in (entry['archive'], entry.get('preview')):
+        if rel:
+            try:
+                os.remove(os.path.join(get_archive_dir(), rel))
+            except OSError:
+                pass
+
+
+def _undo_archive(entry, src):
+    """Roll back a pack whose source folder could only be partly removed.
+
+    The folder is rebuilt from the zip and the index entry dropped, so the mod
+    is never half-deleted on disk while also listed as archived.
+    """
+    try:
+        _extract_zip(os.path.join(get_archive_dir(), entry['archive']), src)
+        repaired = True
+    except (OSError, zipfile.BadZipFile) as e:
+        print(f"Failed to repair {src} from its archive: {e}")
+        repaired = False
+    key = _archive_key(entry['root'], entry['char'], entry['clean_name'])
+    unlisted = _update_archive_index(lambda index: index['archived'].pop(key, None))
+    # Keep the zip if it is the only complete copy left
+    if repaired and unlisted:
+        _remove_archive_files(entry)
+
+
+def archive_mod(root_name, char, folder):
+    """Pack one disabled mod into a zip under the archive dir and remove the folder.
+
+    The preview image is copied next to the archive and the readme text and
+    override hashes are kept in the archive index, so all three stay usable
+    without extracting. Returns None if the mod is gone or busy elsewhere.
+    """
+    root_path = get_root_path(root_name)
+    if root_path is None or not folder.startswith("DISABLED_"):
+        return None
+    src = os.path.join(root_path, char, folder)
+    clean = _clean_mod_name(folder)
+    rel_base = _archive_rel_base(root_name, char, clean)
+    lock = _mod_lock_at(rel_base)
+    if not lock.acquire(blocking=False):
+        return None
+    zip_path = os.path.join(get_archive_dir(), rel_base + '.zip')
+    tmp_path = zip_path + '.tmp'
+    try:
+        if not os.path.isdir(src):
+            return None
+        refresh_mods_index([(root_name, char, folder)])
+        with _ini_index_lock:
+            hashes = sorted(_mod_hashes.get((root_name, char, clean), ()))
+        os.makedirs(os.path.dirname(zip_path), exist_ok=True)
+        original_size = 0
+        with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+            for dirpath, dirs, files in os.walk(src):
+                for name in files:
+                    full = os.path.join(dirpath, name)
+                    original_size += os.path.getsize(full)
+                    zf.write(full, arcname=os.path.relpath(full, src))
+        preview_rel = None
+        preview_path = find_preview_path(src)
+        if preview_path:
+            preview_rel = f"{rel_base}.preview{os.path.splitext(preview_path)[1].lower()}"
+            shutil.copyfile(preview_path, os.path.join(get_archive_dir(), preview_rel))
+        readme_name, readme = None, None
+        readme_path = find_readme_path(src)
+        if readme_path:
+            readme_name = os.path.basename(readme_path)
+            try:
+                readme = read_text_file(readme_path)
+            except Exception:
+                readme = None
+        os.replace(tmp_path, zip_path)
+        entry = {
+            "root": root_name,
+            "char": char,
+            "folder": folder,
+            "clean_name": clean,
+            "archive": rel_base + '.zip',
+            "preview": preview_rel,
+            "readme_name": readme_name,
+            "readme": readme,
+            "hashes": hashes,
+            "original_size": original_size,
+            "archived_size": os.path.getsize(zip_path),
+            "archived_at": time.time(),
+        }
+        key = _archive_key(root_name, char, clean)
+
+        def add_entry(index):
+            index['archived'][key] = entry
+            index['disabled_since'].pop(key, None)
+
+        try:
+            saved = _update_archive_index(add_entry)
+        except ArchiveIndexError:
+            saved = False
+        if not saved:
+            _remove_archive_files(entry)
+            raise OSError("Failed to save archive index, mod left in place")
+        # The entry is on disk, only now is it safe to drop the folder
+        try:
+            shutil.rmtree(src)
+        except OSError:
+            _undo_archive(entry, src)
+            raise
+        return entry
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        lock.release()
+
+
+def restore_mod(entry):
+    """Stream an archived mod back into its library root as a disabled folder.
+
+    Raises ModError(409) while another thread or process packs or restores
+    the same mod.
+    """
+    root_path = get_root_path(entry['root'])
+    if root_path is None:
+        raise OSError(f"Library root not found: {entry['root']}")
+    key = _archive_key(entry['root'], entry['char'], entry['clean_name'])
+    lock = mod_lock(entry['root'], entry['char'], entry['clean_name'])
+    if not lock.acquire(blocking=False):
+        raise ModError("MOD is being archived or restored", 409)
+    try:
+        dst = os.path.join(root_path, entry['char'], entry['folder'])
+        current = load_archive_index()['archived'].get(key)
+        if current is None:
+            # Restored by someone else while we waited for the lock
+            if os.path.isdir(dst):
+                return dst
+            raise ModError("MOD not found", 404)
+        if os.path.exists(dst):
+            raise OSError(f"Target already exists: {dst}")
+        tmp_dir = dst + '.restoring'
+        if os.path.exists(tmp_dir):
+            # Left over by a crashed restore; nobody else holds the lock
+            shutil.rmtree(tmp_dir)
+        os.makedirs(tmp_dir)
+        try:
+            _extract_zip(os.path.join(get_archive_dir(), current['archive']), tmp_dir)
+            os.rename(tmp_dir, dst)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        if _update_archive_index(lambda index: index['archived'].pop(key, None)):
+            _remove_archive_files(current)
+        return dst
+    finally:
+        lock.release()
+
+
+def forget_disabled_since(root_name, char, clean_name):
+    """Reset the disabled timer of a mod that was just enabled."""
+    if not archive_in_use():
+        return
+    key = _archive_key(root_name, char, clean_name)
+    with _index_lock():
+        index = load_archive_index()
+        if index['disabled_since'].pop(key, None) is not None:
+            save_archive_index(index)
+
+
+def sweep_archive(should_stop=None):
+    """Pack every mod that has stayed disabled past `archive_after_days`."""
+    if not CONFIG.get('archive_enabled'):
+        return 0
+    roots = get_mod_roots()
+    if any(_is_inside(get_archive_dir(), r['path']) for r in roots):
+        print("Archive dir must be outside every mod library root, skipping archive sweep")
+        return 0
+    threshold = float(CONFIG.get('archive_after_days', 30)) * 86400
+    now = time.time()
+    candidates = []
+    seen = set()
+    complete = set()
+    with _index_lock():
+        index = load_archive_index()
+        disabled_since = index['disabled_since']
+        for root, mod_dirs, ok in scan_roots(_iter_mod_dirs, roots):
+            if not ok:
+                continue
+            complete.add(root['name'])
+            for char, folder, _ in mod_dirs:
+                if not folder.startswith("DISABLED_") or folder.endswith('.restoring'):
+                    continue
+                key = _archive_key(root['name'], char, _clean_mod_name(folder))
+                seen.add(key)
+                since = disabled_since.setdefault(key, now)
+                if now - since >= threshold:
+                    candidates.append((root['name'], char, folder))
+        # A root that did not answer keeps its timers; a spun-down disk must
+        # not restart the clock of every mod on it
+        for key in [k for k in disabled_since if k not in seen and k.partition('|')[0] in complete]:
+            del disabled_since[key]
+        save_archive_index(index)
+    packed = 0
+    for root_name, char, folder in candidates:
+        if should_stop and should_stop():
+            break
+        try:
+            if archive_mod(root_name, char, folder):
+                packed += 1
+        except (OSError, zipfile.BadZipFile) as e:
+            print(f"Failed to archive {root_name}/{char}/{folder}: {e}")
+    return packed
+
+
+def archive_worker(should_stop):
+    interval = float(CONFIG.get('archive_interval_minutes', 60)) * 60
+    while not should_stop():
+        try:
+            sweep_archive(should_stop)
+        except ArchiveIndexError as e:
+            print(f"Archive sweep skipped: {e.message}")
+        waited = 0.0
+        while waited < interval and not should_stop():
+            time.sleep(1)
+            waited += 1
+
+
+
+
+# Operations behind the API routes and the CLI commands
+
+def _preview_url(char, folder, root_name):
+    return f"/api/preview?char={quote(char)}&mod={quote(folder)}&root={quote(root_name)}"
+
+
+def list_chars():
+    """Return characters merged across all library roots, most mods first."""
+    chars_img_dir = get_chars_img_dir()
+
+    def scan(root):
+        counts = {}
+        if not os.path.isdir(root['path']):
+            return counts
+        for name in os.listdir(root['path']):
+            full = os.path.join(root['path'], name)
+            if not os.path.isdir(full):
+                continue
+            counts[name] = sum(1 for x in os.listdir(full) if os.path.isdir(os.path.join(full, x)))
+        return counts
+
+    merged = {}
+    for root, counts, _ in scan_roots(scan):
+        for name, count in (counts or {}).items():
+            entry = merged.setdefault(name, {"mod_count": 0, "roots": []})
+            entry["mod_count"] += count
+            entry["roots"].append(root['name'])
+    for archived in load_archive_index()['archived'].values():
+        entry = merged.setdefault(archived['char'], {"mod_count": 0, "roots": []})
+        entry["mod_count"] += 1
+        if archived['root'] not in entry["roots"]:
+            entry["roots"].append(archived['root'])
+    chars = []
+    for name, entry in merged.items():
+        safe = sanitize_filename(name)
+        img_path = os.path.join(chars_img_dir, f"{safe}.png")
+        image_url = f"/static/chars/{safe}.png" if os.path.exists(img_path) else None
+        chars.append({"name": name, "image_url": image_url, "mod_count": entry["mod_count"], "roots": entry["roots"]})
+    chars.sort(key=lambda c: c["mod_count"], reverse=True)
+    return chars
+
+
+def list_mods(char_name):
+    """Return the mods of one character across all roots, archived ones included."""
+    favorites = load_favorites()
+
+    def scan(root):
+        char_path = os.path.join(root['path'], char_name)
+        root_mods = []
+        if not os.path.isdir(char_path):
+            return root_mods
+        for folder in os.listdir(char_path):
+            full_path = os.path.join(char_path, folder)
+            if not os.path.isdir(full_path) or folder.endswith('.restoring'):
+                continue
+            is_disabled = folder.startswith("DISABLED_")
+            has_preview = find_preview_path(full_path) is not None
+            preview_url = _preview_url(char_name, folder, root['name']) if has_preview else None
+            clean_name = folder.replace("DISABLED_", "", 1) if is_disabled else folder
+
+            # Check for txt files (readme, description, etc.)
+            has_readme = False
+            for item in os.listdir(full_path):
+                if item.lower().endswith('.txt'):
+                    has_readme = True
+                    break
+
+            root_mods.append({
+                "name": folder,
+                "clean_name": clean_name,
+                "disabled": is_disabled,
+                "path": folder,
+                "root": root['name'],
+                "preview_url": preview_url,
+                "favorite": is_favorite(favorites, root['name'], char_name, folder),
+                "has_readme": has_readme,
+            })
+        return root_mods
+
+    mods = []
+    for _, root_mods, _ in scan_roots(scan):
+        mods.extend(root_mods or [])
+    for archived in get_archived_mods(char_name):
+        folder = archived['folder']
+        mods.append({
+            "name": folder,
+            "clean_name": archived['clean_name'],
+            "disabled": True,
+            "path": folder,
+            "root": archived['root'],
+            "preview_url": _preview_url(char_name, folder, archived['root']) if archived.get('preview') else None,
+            "favorite": is_favorite(favorites, archived['root'], char_name, folder),
+            "has_readme": archived.get('readme') is not None,
+            "archived": True,
+        })
+    return mods
+
+
+def search_mods(query, char=None):
+    """Find mods whose name contains `query` (case-insensitive), across all roots."""
+    needle = query.lower()
+    results = []
+    for root, mod_dirs, _ in scan_roots(_iter_mod_dirs):
+        for mod_char, folder, _ in mod_dirs or []:
+            if char and mod_char != char:
+                continue
+            clean = _clean_mod_name(folder)
+            if needle in clean.lower():
+                results.append({"char": mod_char, "name": folder, "clean_name": clean,
+                                "disabled": folder.startswith("DISABLED_"), "root": root['name'], "archived": False})
+    for archived in load_archive_index()['archived'].values():
+        if char and archived['char'] != char:
+            continue
+        if needle in archived['clean_name'].lower():
+            results.append({"char": archived['char'], "name": archived['folder'], "clean_name": archived['clean_name'],
+                            "disabled": True, "root": archived['root'], "archived": True})
+    results.sort(key=lambda m: (m['char'], m['clean_name'].lower()))
+    return results
+
+
+def get_preview_path(char, mod, root_name=None):
+    _, mod_dir = find_mod_dir(char, mod, root_name)
+    if mod_dir:
+        return find_preview_path(mod_dir)
+    archived = find_archived_mod(char, mod, root_name)
+    if archived and archived.get('preview'):
+        preview_path = os.path.join(get_archive_dir(), archived['preview'])
+        if os.path.isfile(preview_path):
+            return preview_path
+    return None
+
+
+def get_readme(char, mod, root_name=None):
+    """Return {"content", "filename"} for a mod's readme."""
+    _, mod_path = find_mod_dir(char, mod, root_name)
+    if not mod_path:
+        # Archived mods keep their readme text in the archive index
+        archived = find_archived_mod(char, mod, root_name)
+        if not archived:
+            raise ModError("MOD not found", 404)
+        if archived.get('readme') is None:
+            raise ModError("No readme found", 404)
+        return {"content": archived['readme'], "filename": archived.get('readme_name')}
+
+    txt_file = find_readme_path(mod_path)
+    if not txt_file:
+        raise ModError("No readme found", 404)
+    try:
+        return {"content": read_text_file(txt_file), "filename": os.path.basename(txt_file)}
+    except Exception as e:
+        raise ModError(str(e), 500)
+
+
+def toggle_favorite(char, mod, root_name=None):
+    favorites = load_favorites()
+    if not root_name:
+        root_name = find_mod_dir(char, mod)[0] or (find_archived_mod(char, mod) or {}).get('root')
+    if not root_name:
+        raise ModError("MOD not found", 404)
+    mod_key = favorite_key(root_name, char, mod)
+    legacy_key = f"{char}:{mod}"
+    favorite = not is_favorite(favorites, root_name, char, mod)
+    if favorite:
+        favorites[mod_key] = True
+    elif legacy_key in favorites:
+        # Leave the legacy heart to copies of this folder in other roots
+        favorites[mod_key] = False
+    else:
+        favorites.pop(mod_key, None)
+    save_favorites(favorites)
+    return favorite
+
+
+def toggle_mod(char, mod_name, action, root_name=None, force=False):
+    """Apply enable/disable/enable_all/disable_all to a character's mods.
+
+    Enabling one mod disables every other mod of the character in all roots.
+    Raises ModConflictError when enabling would clash on hash overrides,
+    unless `force` is set. Archived mods are restored only after that check.
+    """
+    mod_name = mod_name or ''
+    if not char or not action:
+        raise ModError("Missing parameters", 400)
+    if root_name and get_root_path(root_name) is None:
+        raise ModError("Unknown library root", 400)
+    if action in ('enable', 'disable') and not mod_name:
+        raise ModError("Missing parameters", 400)
+    # Enabling an archived mod restores it from cold storage
+    restoring = []
+    if action == 'enable' and not find_mod_dir(char, mod_name, root_name)[1]:
+        entry = find_archived_mod(char, mod_name, root_name)
+        if entry:
+            restoring = [entry]
+            root_name = entry['root']
+        elif mod_name.startswith("DISABLED_") and find_mod_dir(char, _clean_mod_name(mod_name), root_name)[1]:
+            # Already enabled
+            mod_name = _clean_mod_name(mod_name)
+        else:
+            raise ModError("MOD not found", 404)
+    elif action == 'disable':
+        if not (find_mod_dir(char, mod_name, root_name)[1]
+                or find_mod_dir(char, f"DISABLED_{mod_name}", root_name)[1]
+                or find_archived_mod(char, mod_name, root_name)):
+            raise ModError("MOD not found", 404)
+    elif action == 'enable_all':
+        restoring = get_archived_mods(char)
+    char_dirs = get_char_dirs(char)
+    if not char_dirs and not restoring:
+        raise ModError("Character directory not found", 404)
+    if mod_name and not root_name:
+        root_name, _ = find_mod_dir(char, mod_name)
+    if action in ('enable', 'enable_all') and not force:
+        conflicts = check_enable_conflicts(char, char_dirs, mod_name, root_name, action, restoring)
+        if conflicts:
+            raise ModConflictError(conflicts)
+    for entry in restoring:
+        try:
+            restore_mod(entry)
+        except (OSError, zipfile.BadZipFile) as e:
+            raise ModError(f"Failed to restore archived MOD: {e}", 500)
+    if restoring:
+        char_dirs = get_char_dirs(char)
+    owner_path = dict(char_dirs).get(root_name)
+    use_locks = archive_in_use()
+
+    # DISABLED_ folders may be zipped by the archiver, possibly in another
+    # process; only rename them while holding their mod lock
+    held = None
+    if action == 'enable' and owner_path and mod_name.startswith("DISABLED_") and use_locks:
+        held = mod_lock(root_name, char, _clean_mod_name(mod_name))
+        if not held.acquire(blocking=False):
+            raise ModError("MOD is being archived", 409)
+        if not os.path.isdir(os.path.join(owner_path, mod_name)):
+            # Packed by a sweep after the lookup above; nothing has been renamed yet
+            held.release()
+            raise ModError("MOD was just archived, please retry", 409)
+
+    # Renames are mirrored into the index so enable-time checks need no rescan
+    enabled_now = []
+
+    def rename_mod(char_path, current_name, target_state):
+        src = os.path.join(char_path, current_name)
+        if not os.path.isdir(src):
+            return
+        root_of_dir = next((r for r, p in char_dirs if p == char_path), None)
+        is_disabled = current_name.startswith("DISABLED_")
+        if target_state == 'disable' and not is_disabled:
+            new_name = f"DISABLED_{current_name}"
+            dst = os.path.join(char_path, new_name)
+            if not os.path.exists(dst):
+                os.rename(src, dst)
+                note_mod_renamed(root_of_dir, char, new_name)
+        elif target_state == 'enable' and is_disabled:
+            new_name = current_name.replace("DISABLED_", "", 1)
+            dst = os.path.join(char_path, new_name)
+            lock = None
+            if use_locks and not (held and char_path == owner_path and current_name == mod_name):
+                lock = mod_lock(root_of_dir, char, new_name)
+                if not lock.acquire(blocking=False):
+                    # Being packed right now; enable_all leaves it archived
+                    return
+            try:
+                if os.path.isdir(src) and not os.path.exists(dst):
+                    os.rename(src, dst)
+                    note_mod_renamed(root_of_dir, char, new_name)
+                    enabled_now.append((root_of_dir, char, new_name))
+                    forget_disabled_since(root_of_dir, char, new_name)
+            finally:
+                if lock:
+                    lock.release()
+    try:
+        if action == 'enable':
+            for _, char_path in char_dirs:
+                all_dirs = [d for d in os.listdir(char_path) if os.path.isdir(os.path.join(char_path, d))]
+                for d in all_dirs:
+                    # An already-enabled target is the one mod that stays on
+                    if char_path != owner_path or d != mod_name:
+                        rename_mod(char_path, d, 'disable')
+            if owner_path:
+                rename_mod(owner_path, mod_name, 'enable')
+        elif action == 'disable':
+            if owner_path:
+                rename_mod(owner_path, mod_name, action)
+        elif action == 'enable_all':
+            for _, char_path in char_dirs:
+                for m in os.listdir(char_path):
+                    rename_mod(char_path, m, 'enable')
+        elif action == 'disable_all':
+            for _, char_path in char_dirs:
+                for m in os.listdir(char_path):
+                    rename_mod(char_path, m, 'disable')
+    finally:
+        if held:
+            held.release()
+    # Mods enabled with force skipped the conflict check and may not be indexed yet
+    with _ini_index_lock:
+        unindexed = [m for m in enabled_now if (m[0], char, m[2]) not in _mod_hashes]
+    refresh_mods_index(unindexed)
+
+
+def sync_chars():
+    """Fetch the character list from the Kuro wiki API and create local dirs/avatars."""
+    import requests
+
+    url = "https://api.kurobbs.com/wiki/core/catalogue/item/getPage"
+    headers = {
+        "accept": "application/json, text/plain, */*",
+        "accept-language": "zh-CN,zh;q=0.9",
+        "content-type": "application/x-www-form-urlencoded;charset=UTF-8",
+        "user-agent": "Mozilla/5.0",
+    }
+    data = "catalogueId=1105&page=1&limit=1000"
+    resp = requests.post(url, headers=headers, data=data, timeout=15)
+    resp.raise_for_status()
+    body = resp.json()
+    data_obj = body.get('data') or {}
+    results = data_obj.get('results') if isinstance(data_obj, dict) else {}
+    items = (results.get('records') if isinstance(results, dict) else None) or []
+    if not items and isinstance(data_obj, dict):
+        items = data_obj.get('list') or data_obj.get('items') or []
+    if not items and isinstance(data_obj, list):
+        items = data_obj
+
+    os.makedirs(get_chars_img_dir(), exist_ok=True)
+    saved_chars = []
+    for item in items:
+        name = item.get('name') or item.get('title') or ''
+        if not name:
+            continue
+        safe_name = sanitize_filename(name)
+        char_path = os.path.join(get_mods_root(), safe_name)
+        if not os.path.exists(char_path):
+            os.makedirs(char_path)
+        content = item.get('content') or {}
+        icon = content.get('contentUrl') or item.get('icon') or item.get('cover') or item.get('image')
+        if icon:
+            try:
+                img_resp = requests.get(icon, timeout=10)
+                img_resp.raise_for_status()
+                with open(os.path.join(get_chars_img_dir(), f"{safe_name}.png"), 'wb') as f:
+                    f.write(img_resp.content)
+            except Exception:
+                pass
+        saved_chars.append(safe_name)
+    return saved_chars
+
+
+def current_conflicts():
+    refresh_ini_index()
+    return find_conflicts(get_enabled_mods())
+
+
+def get_root_stats():
+    roots = []
+    with _root_scan_lock:
+        for root in get_mod_roots():
+            entry = {"name": root['name'], "path": root['path'], "exists": os.path.isdir(root['path'])}
+            entry.update(_root_scan_stats.get(root['name'], {}))
+            roots.append(entry)
+    return roots
+
+
+def reconcile(dry_run=False):
+    """Align local state with what is on disk and report what needs attention.
+
+    Removes leftovers of interrupted restores, drops archive index entries whose
+    zip is gone, moves archive files no entry refers to into a quarantine dir
+    and drops favorites of mods that no longer exist, then reports characters
+    with more than one enabled mod and hash override conflicts. Favorites on a
+    root whose scan did not complete are kept, as are legacy favorites unless
+    every root was scanned. Anything another process is packing or restoring
+    right now is left alone. Enabled mods are never changed, since which one to
+    keep is the user's call.
+    """
+    report = {"removed_restoring": [], "pruned_archive_entries": [], "orphan_archive_files": [],
+              "pruned_favorites": [], "skipped_roots": [], "multi_enabled": {}, "conflicts": []}
+    use_locks = archive_in_use()
+    live = set()
+    live_rooted = set()
+    enabled_by_char = {}
+    complete = set()
+    for root, mod_dirs, ok in scan_roots(_iter_mod_dirs):
+        if not ok:
+            report["skipped_roots"].append(root['name'])
+            continue
+        complete.add(root['name'])
+        for char, folder, mod_dir in mod_dirs:
+            if folder.endswith('.restoring'):
+                clean = _clean_mod_name(folder[:-len('.restoring')])
+                lock = mod_lock(root['name'], char, clean) if use_locks else None
+                if lock and not lock.acquire(blocking=False):
+                    continue
+                try:
+                    report["removed_restoring"].append(mod_dir)
+                    if not dry_run:
+                        shutil.rmtree(mod_dir, ignore_errors=True)
+                finally:
+                    if lock:
+                        lock.release()
+                continue
+            live.add((char, _clean_mod_name(folder)))
+            live_rooted.add((root['name'], char, _clean_mod_name(folder)))
+            if not folder.startswith("DISABLED_"):
+                enabled_by_char.setdefault(char, []).append(f"{root['name']}/{folder}")
+
+    archive_dir = get_archive_dir()
+    with _index_lock():
+        index = load_archive_index()
+        referenced = set()
+        for key, entry in list(index['archived'].items()):
+            if os.path.isfile(os.path.join(archive_dir, entry['archive'])):
+                live.add((entry['char'], entry['clean_name']))
+                live_rooted.add((entry['root'], entry['char'], entry['clean_name']))
+                referenced.update(os.path.normcase(rel) for rel in (entry['archive'], entry.get('preview')) if rel)
+                continue
+            report["pruned_archive_entries"].append(key)
+            del index['archived'][key]
+        if report["pruned_archive_entries"] and not dry_run:
+            save_archive_index(index)
+
+        # Zips and previews left behind by a crash between writing them and
+        # saving their index entry
+        for dirpath, dirs, files in os.walk(archive_dir):
+            if dirpath == archive_dir:
+                dirs[:] = [d for d in dirs if d not in (ARCHIVE_LOCK_DIR, ARCHIVE_QUARANTINE_DIR)]
+                continue
+            for name in files:
+                if not (name.endswith('.zip') or '.preview.' in name):
+                    continue
+                rel = os.path.relpath(os.path.join(dirpath, name), archive_dir)
+                if os.path.normcase(rel) in referenced:
+                    continue
+                lock = _archive_file_lock(rel)
+                if not lock.acquire(blocking=False):
+                    # Still being written by a pack in progress
+                    continue
+                try:
+                    report["orphan_archive_files"].append(rel)
+                    if not dry_run:
+                        # May be the only copy of a mod left by a stale index backup
+                        _quarantine_archive_file(rel)
+                finally:
+                    lock.release()
+
+    favorites = load_favorites()
+    for mod_key in list(favorites):
+        root_name, sep, rest = mod_key.partition('|')
+        char, _, folder = (rest if sep else mod_key).partition(':')
+        if sep:
+            if root_name not in complete:
+                continue
+            alive = (root_name, char, _clean_mod_name(folder)) in live_rooted
+        else:
+            if report["skipped_roots"]:
+                continue
+            alive = (char, _clean_mod_name(folder)) in live
+        if not alive:
+            report["pruned_favorites"].append(mod_key)
+            del favorites[mod_key]
+    if report["pruned_favorites"] and not dry_run:
+        save_favorites(favorites)
+
+    report["multi_enabled"] = {c: mods for c, mods in enabled_by_char.items() if len(mods) > 1}
+    report["conflicts"] = current_conflicts()
+    return report
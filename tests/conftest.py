@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import modcore  # noqa: E402
+
+
+def make_mod(root_dir, char, folder, hashes=(), files=None):
+    """Create a mod folder with one .ini overriding `hashes` plus extra files."""
+    mod_dir = os.path.join(str(root_dir), char, folder)
+    os.makedirs(mod_dir, exist_ok=True)
+    if hashes:
+        with open(os.path.join(mod_dir, 'mod.ini'), 'w', encoding='utf-8') as f:
+            for i, h in enumerate(hashes):
+                f.write(f"[TextureOverride{i}]\nhash = {h}\n")
+    for name, content in (files or {}).items():
+        path = os.path.join(mod_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content if isinstance(content, bytes) else content.encode('utf-8'))
+    return mod_dir
+
+
+def reset_process_state(monkeypatch):
+    """Drop every in-memory cache, as if a new process (e.g. the CLI) started."""
+    monkeypatch.setattr(modcore, '_ini_file_cache', {})
+    monkeypatch.setattr(modcore, '_mod_hashes', {})
+    monkeypatch.setattr(modcore, '_hash_index', {})
+    monkeypatch.setattr(modcore, '_mod_folders', {})
+    monkeypatch.setattr(modcore, '_indexed_roots', set())
+    monkeypatch.setattr(modcore, '_ini_cache_loaded', False)
+    monkeypatch.setattr(modcore, '_ini_cache_dirty', False)
+    monkeypatch.setattr(modcore, '_ini_cache_stamp', None)
+    monkeypatch.setattr(modcore, '_root_scan_stats', {})
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    """Point modcore at a throwaway library with an `ssd` and an `hdd` root."""
+    for name in ('ssd', 'hdd'):
+        (tmp_path / name).mkdir()
+    config = {
+        "mod_roots": [
+            {"name": "ssd", "path": str(tmp_path / 'ssd')},
+            {"name": "hdd", "path": str(tmp_path / 'hdd')},
+        ],
+        "archive_dir": str(tmp_path / 'archive'),
+    }
+    monkeypatch.setattr(modcore, 'CONFIG', config)
+    monkeypatch.setattr(modcore, 'FAVORITES_FILE', str(tmp_path / 'favorites.json'))
+    monkeypatch.setattr(modcore, 'INI_CACHE_FILE', str(tmp_path / 'ini_cache.json'))
+    reset_process_state(monkeypatch)
+    return tmp_path
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+import os
+
+import pytest
+
+import modcore
+from conftest import make_mod
+
+
+@pytest.fixture
+def archiving(library, monkeypatch):
+    modcore.CONFIG.update({"archive_enabled": True, "archive_after_days": 0})
+    return library
+
+
+def test_archive_and_restore_round_trip(archiving):
+    files = {"mod.ini": "[TextureOverrideBody]\nhash = aaaa1111\n",
+             "preview.png": b"\x89PNG fake",
+             "readme.txt": "hello",
+             "tex/body.dds": b"\x00" * 4096}
+    src = make_mod(archiving / 'hdd', 'A', 'DISABLED_m1', files=files)
+
+    assert modcore.sweep_archive() == 1
+    assert not os.path.exists(src)
+    entry = modcore.find_archived_mod('A', 'm1')
+    assert entry['hashes'] == ['aaaa1111']
+    assert os.path.isfile(os.path.join(modcore.get_archive_dir(), entry['archive']))
+    mods = modcore.list_mods('A')
+    assert [(m['clean_name'], m['root'], m['archived'], m['has_readme']) for m in mods] == [('m1', 'hdd', True, True)]
+    assert modcore.get_readme('A', 'DISABLED_m1')['content'] == 'hello'
+    assert modcore.get_preview_path('A', 'DISABLED_m1').endswith('.preview.png')
+
+    modcore.toggle_mod('A', 'DISABLED_m1', 'enable')
+    restored = archiving / 'hdd' / 'A' / 'm1'
+    for name, content in files.items():
+        data = (restored / name).read_bytes()
+        assert data == (content if isinstance(content, bytes) else content.encode('utf-8'))
+    assert modcore.find_archived_mod('A', 'm1') is None
+    assert not os.path.exists(os.path.join(modcore.get_archive_dir(), entry['archive']))
+
+
+def test_index_save_failure_keeps_mod_in_place(archiving, monkeypatch):
+    src = make_mod(archiving / 'hdd', 'A', 'DISABLED_m1', hashes=['aaaa1111'])
+    # Let the sweep record the disabled timer, then fail the save that adds the entry
+    monkeypatch.setattr(modcore, 'save_archive_index', lambda index: not index['archived'])
+
+    assert modcore.sweep_archive() == 0
+    assert os.path.isfile(os.path.join(src, 'mod.ini'))
+    assert modcore.find_archived_mod('A', 'm1') is None
+    zips = [f for _, _, files in os.walk(modcore.get_archive_dir()) for f in files if f.endswith('.zip')]
+    assert zips == []
+
+
+def test_partial_delete_rolls_back_entry(archiving, monkeypatch):
+    src = make_mod(archiving / 'hdd', 'A', 'DISABLED_m1', hashes=['aaaa1111'], files={"a.txt": "a"})
+
+    def broken_rmtree(path, *args, **kwargs):
+        os.remove(os.path.join(path, 'mod.ini'))
+        raise OSError("file in use")
+
+    monkeypatch.setattr(modcore.shutil, 'rmtree', broken_rmtree)
+    with pytest.raises(OSError):
+        modcore.archive_mod('hdd', 'A', 'DISABLED_m1')
+    assert os.path.isfile(os.path.join(src, 'mod.ini'))
+    assert modcore.find_archived_mod('A', 'm1') is None
+
+
+def test_conflict_is_checked_before_restoring(archiving):
+    make_mod(archiving / 'ssd', 'B', 'other', hashes=['aaaa1111'])
+    make_mod(archiving / 'hdd', 'A', 'DISABLED_m1', hashes=['aaaa1111'])
+    assert modcore.sweep_archive() == 1
+
+    with pytest.raises(modcore.ModConflictError):
+        modcore.toggle_mod('A', 'DISABLED_m1', 'enable')
+    assert modcore.find_archived_mod('A', 'm1') is not None
+    assert not os.path.exists(archiving / 'hdd' / 'A' / 'DISABLED_m1')
+
+
+def test_restore_refuses_while_mod_is_locked(archiving):
+    make_mod(archiving / 'hdd', 'A', 'DISABLED_m1', hashes=['aaaa1111'])
+    assert modcore.sweep_archive() == 1
+    lock = modcore.mod_lock('hdd', 'A', 'm1')
+    assert lock.acquire(blocking=False)
+    try:
+        with pytest.raises(modcore.ModError) as e:
+            modcore.toggle_mod('A', 'DISABLED_m1', 'enable')
+        assert e.value.status == 409
+    finally:
+        lock.release()
+    assert modcore.find_archived_mod('A', 'm1') is not None
+
+
+def test_corrupt_index_fails_loudly(archiving):
+    os.makedirs(modcore.get_archive_dir())
+    index_path = os.path.join(modcore.get_archive_dir(), modcore.ARCHIVE_INDEX_NAME)
+    with open(index_path, 'w', encoding='utf-8') as f:
+        f.write('{"archived": {"k": ')
+    with pytest.raises(modcore.ArchiveIndexError):
+        modcore.sweep_archive()
+    with open(index_path, 'r', encoding='utf-8') as f:
+        assert f.read() == '{"archived": {"k": '
+
+
+def test_unscanned_root_keeps_disabled_timers(archiving, monkeypatch):
+    modcore.CONFIG['archive_after_days'] = 30
+    make_mod(archiving / 'hdd', 'A', 'DISABLED_m1')
+    assert modcore.sweep_archive() == 0
+    key = modcore._archive_key('hdd', 'A', 'm1')
+    since = modcore.load_archive_index()['disabled_since'][key]
+
+    real_iter = modcore._iter_mod_dirs
+
+    def iter_mod_dirs(root):
+        if root['name'] == 'hdd':
+            raise OSError("drive not ready")
+        return real_iter(root)
+
+    monkeypatch.setattr(modcore, '_iter_mod_dirs', iter_mod_dirs)
+    modcore.sweep_archive()
+    assert modcore.load_archive_index()['disabled_since'][key] == since
+
+
+def test_enable_racing_a_sweep_changes_nothing(archiving, monkeypatch):
+    modcore.CONFIG['archive_after_days'] = 30
+    make_mod(archiving / 'ssd', 'A', 'other')
+    make_mod(archiving / 'hdd', 'A', 'DISABLED_m1')
+    real_mod_lock = modcore.mod_lock
+
+    def racing_mod_lock(root_name, char, clean_name):
+        lock = real_mod_lock(root_name, char, clean_name)
+        real_acquire = lock.acquire
+
+        def acquire(blocking=True):
+            # The sweep packs the mod between the lookup and the lock
+            modcore.archive_mod(root_name, char, f"DISABLED_{clean_name}")
+            return real_acquire(blocking)
+
+        lock.acquire = acquire
+        return lock
+
+    monkeypatch.setattr(modcore, 'mod_lock', racing_mod_lock)
+    with pytest.raises(modcore.ModError) as e:
+        modcore.toggle_mod('A', 'DISABLED_m1', 'enable', force=True)
+    assert e.value.status == 409
+    assert os.path.isdir(archiving / 'ssd' / 'A' / 'other')
+    assert modcore.find_archived_mod('A', 'm1') is not None
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+
+import cli
+import modcore
+from conftest import make_mod
+
+
+def _folders(root_dir, char):
+    return sorted(os.listdir(os.path.join(str(root_dir), char)))
+
+
+def test_enable_is_idempotent(library):
+    make_mod(library / 'ssd', 'A', 'foo')
+    make_mod(library / 'ssd', 'A', 'DISABLED_bar')
+    make_mod(library / 'hdd', 'A', 'baz')
+
+    assert cli.main(['enable', 'A', 'foo']) == 0
+    assert _folders(library / 'ssd', 'A') == ['DISABLED_bar', 'foo']
+    assert _folders(library / 'hdd', 'A') == ['DISABLED_baz']
+    assert cli.main(['enable', 'A', 'foo']) == 0
+    assert _folders(library / 'ssd', 'A') == ['DISABLED_bar', 'foo']
+    assert _folders(library / 'hdd', 'A') == ['DISABLED_baz']
+
+
+def test_enable_unknown_mod_changes_nothing(library, capsys):
+    make_mod(library / 'ssd', 'A', 'foo')
+    make_mod(library / 'ssd', 'A', 'DISABLED_bar')
+
+    assert cli.main(['enable', 'A', 'nosuch']) == cli.EXIT_ERROR
+    assert 'MOD not found' in capsys.readouterr().err
+    assert _folders(library / 'ssd', 'A') == ['DISABLED_bar', 'foo']
+
+
+def test_reconcile_quarantines_orphan_archive_files(library, capsys):
+    char_dir = os.path.join(modcore.get_archive_dir(), 'hdd', 'A')
+    os.makedirs(char_dir)
+    for name in ('m1.zip', 'm1.preview.png'):
+        with open(os.path.join(char_dir, name), 'wb') as f:
+            f.write(b'x')
+
+    assert cli.main(['reconcile', '--dry-run']) == 0
+    assert 'Would quarantine archive file without entry' in capsys.readouterr().out
+    assert sorted(os.listdir(char_dir)) == ['m1.preview.png', 'm1.zip']
+    assert cli.main(['reconcile']) == 0
+    assert os.listdir(char_dir) == []
+    quarantine = os.path.join(modcore.get_archive_dir(), modcore.ARCHIVE_QUARANTINE_DIR, 'hdd', 'A')
+    assert sorted(os.listdir(quarantine)) == ['m1.preview.png', 'm1.zip']
+    # Quarantined files are not reported again
+    assert modcore.reconcile()['orphan_archive_files'] == []
+
+
+def test_reconcile_keeps_favorites_of_unscanned_root(library):
+    make_mod(library / 'ssd', 'A', 'm0')
+    make_mod(library / 'hdd', 'A', 'DISABLED_m1')
+    modcore.save_favorites({"hdd|A:DISABLED_m1": True, "A:DISABLED_m1": True, "ssd|A:gone": True})
+    os.rename(library / 'hdd', library / 'hdd_unplugged')
+
+    report = modcore.reconcile()
+    assert report['skipped_roots'] == ['hdd']
+    assert report['pruned_favorites'] == ['ssd|A:gone']
+    assert modcore.load_favorites() == {"hdd|A:DISABLED_m1": True, "A:DISABLED_m1": True}
+
+
+def test_damaged_archive_index_is_a_json_error(library, capsys):
+    os.makedirs(modcore.get_archive_dir())
+    with open(os.path.join(modcore.get_archive_dir(), modcore.ARCHIVE_INDEX_NAME), 'w', encoding='utf-8') as f:
+        f.write('{"archived": ')
+    for argv in (['--json', 'list', 'A'], ['--json', 'search', 'x'], ['--json', 'reconcile']):
+        assert cli.main(argv) == cli.EXIT_ERROR
+        out = json.loads(capsys.readouterr().out)
+        assert out['status'] == 'error' and 'Archive index' in out['message']
+
+
+def test_reconcile_skips_restore_in_progress(library):
+    os.makedirs(modcore.get_archive_dir())
+    restoring = make_mod(library / 'hdd', 'A', 'DISABLED_m1.restoring')
+    stale = make_mod(library / 'hdd', 'A', 'DISABLED_m2.restoring')
+    lock = modcore.mod_lock('hdd', 'A', 'm1')
+    assert lock.acquire(blocking=False)
+    try:
+        report = modcore.reconcile()
+    finally:
+        lock.release()
+    assert report['removed_restoring'] == [stale]
+    assert os.path.isdir(restoring)
+    assert not os.path.exists(stale)
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import threading
+
+import pytest
+
+import modcore
+from conftest import make_mod, reset_process_state
+
+
+def _bump_mtime(path):
+    st = os.stat(path)
+    os.utime(path, (st.st_atime, st.st_mtime + 10))
+
+
+def test_parse_ini_hashes_only_reads_override_sections(tmp_path):
+    ini = tmp_path / 'a.ini'
+    ini.write_text("hash = ffff0000\n[TextureOverrideBody]\nhash = ABCD1234\n; hash = 99999999\n"
+                   "[Constants]\nhash = 11111111\n[ShaderOverrideX]\nhash = 2222\n", encoding='utf-8')
+    assert modcore.parse_ini_hashes(str(ini)) == {'abcd1234', '2222'}
+
+
+def test_enable_reports_conflict_with_other_character(library):
+    make_mod(library / 'ssd', 'A', 'DISABLED_m1', hashes=['aaaa'])
+    make_mod(library / 'hdd', 'B', 'm2', hashes=['aaaa'])
+    with pytest.raises(modcore.ModConflictError) as exc:
+        modcore.toggle_mod('A', 'DISABLED_m1', 'enable', root_name='ssd')
+    assert exc.value.conflicts[0]['hash'] == 'aaaa'
+    assert os.path.isdir(library / 'ssd' / 'A' / 'DISABLED_m1')
+
+
+def test_ini_edit_is_picked_up_after_first_index(library):
+    make_mod(library / 'ssd', 'A', 'DISABLED_m1', hashes=['aaaa'])
+    make_mod(library / 'ssd', 'B', 'm2', hashes=['bbbb'])
+    modcore.refresh_ini_index()
+
+    ini = library / 'ssd' / 'A' / 'DISABLED_m1' / 'mod.ini'
+    ini.write_text("[TextureOverrideX]\nhash = bbbb\n", encoding='utf-8')
+    _bump_mtime(ini)
+
+    with pytest.raises(modcore.ModConflictError):
+        modcore.toggle_mod('A', 'DISABLED_m1', 'enable')
+
+
+def test_persisted_cache_avoids_reparsing_in_new_process(library, monkeypatch):
+    make_mod(library / 'ssd', 'A', 'DISABLED_m1', hashes=['aaaa'])
+    make_mod(library / 'hdd', 'B', 'm2', hashes=['bbbb'])
+    modcore.refresh_ini_index()
+    assert os.path.exists(modcore.INI_CACHE_FILE)
+
+    reset_process_state(monkeypatch)
+    parsed = []
+    real_parse = modcore.parse_ini_hashes
+    monkeypatch.setattr(modcore, 'parse_ini_hashes', lambda path: parsed.append(path) or real_parse(path))
+
+    modcore.toggle_mod('A', 'DISABLED_m1', 'enable')
+    assert parsed == []
+
+    ini = library / 'hdd' / 'B' / 'm2' / 'mod.ini'
+    ini.write_text("[TextureOverrideX]\nhash = aaaa\n", encoding='utf-8')
+    _bump_mtime(ini)
+    assert [item['hash'] for item in modcore.current_conflicts()] == ['aaaa']
+    assert parsed == [str(ini)]
+
+
+@pytest.fixture
+def slow_hdd(library, monkeypatch):
+    """Make scans of the `hdd` root hang past a short root_scan_timeout."""
+    release = threading.Event()
+    real_iter = modcore._iter_mod_dirs
+
+    def iter_mod_dirs(root):
+        if root['name'] == 'hdd' and not release.is_set():
+            release.wait(5)
+        return real_iter(root)
+
+    modcore.CONFIG['root_scan_timeout'] = 0.3
+    monkeypatch.setattr(modcore, '_iter_mod_dirs', iter_mod_dirs)
+    yield release
+    release.set()
+    time.sleep(0.05)
+
+
+def test_timed_out_root_keeps_its_index_entries(library, slow_hdd):
+    make_mod(library / 'ssd', 'A', 'DISABLED_m1', hashes=['aaaa'])
+    make_mod(library / 'hdd', 'B', 'm2', hashes=['aaaa'])
+    slow_hdd.set()
+    modcore.refresh_ini_index()
+    slow_hdd.clear()
+
+    modcore.refresh_ini_index()
+    with open(modcore.INI_CACHE_FILE, 'r', encoding='utf-8') as f:
+        assert len(json.load(f)['files']) == 2
+    with pytest.raises(modcore.ModConflictError):
+        modcore.toggle_mod('A', 'DISABLED_m1', 'enable')
+
+
+def test_conflict_check_fails_closed_for_unindexed_root(library, slow_hdd):
+    make_mod(library / 'ssd', 'A', 'DISABLED_m1', hashes=['aaaa'])
+    make_mod(library / 'hdd', 'B', 'm2', hashes=['aaaa'])
+    with pytest.raises(modcore.ModError) as exc:
+        modcore.toggle_mod('A', 'DISABLED_m1', 'enable')
+    assert exc.value.status == 503
+    assert os.path.isdir(library / 'ssd' / 'A' / 'DISABLED_m1')
+
+    modcore.toggle_mod('A', 'DISABLED_m1', 'enable', force=True)
+    assert os.path.isdir(library / 'ssd' / 'A' / 'm1')
+
+
+def test_enable_only_walks_the_target(library, monkeypatch):
+    make_mod(library / 'ssd', 'A', 'DISABLED_m1', hashes=['aaaa'])
+    make_mod(library / 'ssd', 'A', 'm0', hashes=['cccc'])
+    make_mod(library / 'hdd', 'B', 'm2', hashes=['bbbb'])
+    make_mod(library / 'hdd', 'C', 'DISABLED_m3', hashes=['dddd'])
+    modcore.refresh_ini_index()
+
+    walked = []
+    real_list = modcore._list_mod_inis
+    monkeypatch.setattr(modcore, '_list_mod_inis', lambda mod_dir: walked.append(mod_dir) or real_list(mod_dir))
+    monkeypatch.setattr(modcore, '_iter_mod_dirs', lambda root: pytest.fail("enable must not list the library"))
+    modcore.toggle_mod('A', 'DISABLED_m1', 'enable')
+    assert walked == [str(library / 'ssd' / 'A' / 'DISABLED_m1')]
+    assert modcore.get_enabled_mods() == {('ssd', 'A', 'm1'), ('hdd', 'B', 'm2')}
+
+    # An enabled mod's edited .ini is still re-parsed through its cached path
+    ini = library / 'hdd' / 'B' / 'm2' / 'mod.ini'
+    ini.write_text("[TextureOverrideX]\nhash = cccc\n", encoding='utf-8')
+    _bump_mtime(ini)
+    with pytest.raises(modcore.ModConflictError):
+        modcore.toggle_mod('A', 'DISABLED_m0', 'enable')
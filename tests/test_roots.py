@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+import time
+
+import modcore
+from conftest import make_mod
+
+
+def test_mods_merge_across_roots_with_root_tag(library):
+    make_mod(library / 'ssd', 'A', 'm1')
+    make_mod(library / 'hdd', 'A', 'DISABLED_m2')
+    mods = {m['clean_name']: m for m in modcore.list_mods('A')}
+    assert mods['m1']['root'] == 'ssd'
+    assert mods['m2']['root'] == 'hdd'
+    chars = modcore.list_chars()
+    assert chars == [{"name": "A", "image_url": None, "mod_count": 2, "roots": ["ssd", "hdd"]}]
+
+
+def test_slow_root_times_out_without_blocking_fast_root(library):
+    release = threading.Event()
+
+    def scan(root):
+        if root['name'] == 'hdd':
+            release.wait(5)
+        return root['name']
+
+    try:
+        start = time.monotonic()
+        results = modcore.scan_roots(scan, timeout=0.2)
+        assert time.monotonic() - start < 2
+        assert [(root['name'], result, complete) for root, result, complete in results] == [
+            ('ssd', 'ssd', True), ('hdd', None, False)]
+        stats = {entry['name']: entry for entry in modcore.get_root_stats()}
+        assert stats['hdd']['timed_out'] is True
+        assert stats['ssd']['timed_out'] is False
+
+        # While the hdd scan is still overdue, new scans skip it immediately
+        start = time.monotonic()
+        results = modcore.scan_roots(scan, timeout=0.2)
+        assert time.monotonic() - start < 0.2
+        assert [complete for _, _, complete in results] == [True, False]
+    finally:
+        release.set()
+
+
+def test_missing_root_is_not_an_empty_root(library):
+    make_mod(library / 'ssd', 'A', 'm1')
+    os.rename(library / 'hdd', library / 'hdd_unplugged')
+    results = modcore.scan_roots(modcore._iter_mod_dirs)
+    assert [(root['name'], complete) for root, _, complete in results] == [('ssd', True), ('hdd', False)]
+    stats = {entry['name']: entry for entry in modcore.get_root_stats()}
+    assert stats['hdd']['error']
+
+
+def test_favorites_are_per_root(library):
+    make_mod(library / 'ssd', 'A', 'DISABLED_m1')
+    make_mod(library / 'hdd', 'A', 'DISABLED_m1')
+    assert modcore.toggle_favorite('A', 'DISABLED_m1', 'hdd') is True
+    hearts = {m['root']: m['favorite'] for m in modcore.list_mods('A')}
+    assert hearts == {'ssd': False, 'hdd': True}
+
+
+def test_legacy_favorite_key_still_applies(library):
+    make_mod(library / 'ssd', 'A', 'DISABLED_m1')
+    make_mod(library / 'hdd', 'A', 'DISABLED_m1')
+    modcore.save_favorites({"A:DISABLED_m1": True})
+    assert all(m['favorite'] for m in modcore.list_mods('A'))
+    assert modcore.toggle_favorite('A', 'DISABLED_m1', 'ssd') is False
+    hearts = {m['root']: m['favorite'] for m in modcore.list_mods('A')}
+    assert hearts == {'ssd': False, 'hdd': True}